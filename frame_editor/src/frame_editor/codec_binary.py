@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+'''Binary scene format, holding the same data as the yaml files.
+
+Layout (little endian):
+    header    magic, version, frame/geometry/string counts and string blob size
+    frames    one fixed record per frame: name, parent and style as string
+              table indices, position (3 float64) and orientation (4 float64)
+    geometry  side table for frames with a style: frame row, color (4 float64),
+              size (3 float64, meaning depends on style), package and path
+    strings   offsets (count + 1 uint32) into an utf-8 blob
+
+Records are read as numpy arrays straight from a memory map.
+
+Convert between formats with:
+    codec_binary.py scene.yaml scene.fes
+'''
+
+import mmap
+import os
+import struct
+import sys
+
+import numpy
+
+from frame_editor.utils_file import replace_file
+
+EXTENSION = ".fes"
+
+MAGIC = b"FES\0"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHIIII")
+
+FRAME_RECORD = numpy.dtype([
+    ("name", "<u4"), ("parent", "<u4"), ("style", "<u4"),
+    ("position", "<f8", (3,)), ("orientation", "<f8", (4,))])
+
+GEOMETRY_RECORD = numpy.dtype([
+    ("frame", "<u4"), ("color", "<f8", (4,)), ("size", "<f8", (3,)),
+    ("package", "<u4"), ("path", "<u4")])
+
+## Fields of each style stored in the size column
+SIZE_KEYS = {
+    "plane": ("length", "width"),
+    "cube": ("length", "width", "height"),
+    "sphere": ("diameter",),
+    "axis": ("length", "width"),
+    "mesh": ("scale",)
+}
+
+DEFAULT_COLOR = (0.0, 0.5, 0.5, 0.75)
+
+
+class StringTable(object):
+
+    def __init__(self):
+        self.strings = []
+        self.index = {}
+
+    def add(self, string):
+        if string is None:
+            string = ""
+        i = self.index.get(string)
+        if i is None:
+            i = len(self.strings)
+            self.index[string] = i
+            self.strings.append(string)
+        return i
+
+
+def encode(data):
+    '''Returns data in the yaml file schema as bytes'''
+    strings = StringTable()
+    items = sorted(data["frames"].items())
+
+    frames = numpy.zeros(len(items), dtype=FRAME_RECORD)
+    geometry = []
+
+    for row, (name, frame) in enumerate(items):
+        t = frame["position"]
+        o = frame["orientation"]
+        style = frame.get("style", "none")
+
+        record = frames[row]
+        record["name"] = strings.add(name)
+        record["parent"] = strings.add(frame["parent"])
+        record["style"] = strings.add(style)
+        record["position"] = (t["x"], t["y"], t["z"])
+        record["orientation"] = (o["x"], o["y"], o["z"], o["w"])
+
+        if style in SIZE_KEYS and "data" in frame:
+            dat = frame["data"]
+            size = [dat[key] for key in SIZE_KEYS[style]]
+            geometry.append((
+                row,
+                tuple(dat.get("color", DEFAULT_COLOR)),
+                tuple(size + [0.0] * (3 - len(size))),
+                strings.add(dat.get("package", "")),
+                strings.add(dat.get("path", ""))))
+
+    geometry = numpy.array(geometry, dtype=GEOMETRY_RECORD)
+
+    blobs = [s.encode("utf-8") for s in strings.strings]
+    offsets = numpy.cumsum([0] + [len(b) for b in blobs]).astype("<u4")
+    blob = b"".join(blobs)
+
+    header = HEADER.pack(MAGIC, VERSION, 0,
+                         len(frames), len(geometry), len(blobs), len(blob))
+    return b"".join((header, frames.tobytes(), geometry.tobytes(), offsets.tobytes(), blob))
+
+
+def read_columns(buff, dtype, count, offset):
+    '''Returns the columns of count records at offset as python lists.
+    No view of buff is kept, so a memory map can be closed afterwards.'''
+    records = numpy.frombuffer(buff, dtype, count, offset)
+    try:
+        return dict((name, records[name].tolist()) for name in dtype.names)
+    finally:
+        del records
+
+
+def decode(buff):
+    '''Returns data in the yaml file schema from bytes or a memory map'''
+    if len(buff) < HEADER.size:
+        raise ValueError("Not a frame editor scene file")
+
+    magic, version, flags, n_frames, n_geometry, n_strings, blob_size = \
+        HEADER.unpack_from(buff, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a frame editor scene file")
+    if version != VERSION:
+        raise ValueError("Unsupported scene file version {}".format(version))
+
+    offset = HEADER.size
+    frames = read_columns(buff, FRAME_RECORD, n_frames, offset)
+    offset += n_frames * FRAME_RECORD.itemsize
+    geometry = read_columns(buff, GEOMETRY_RECORD, n_geometry, offset)
+    offset += n_geometry * GEOMETRY_RECORD.itemsize
+    offsets = list(struct.unpack_from("<{}I".format(n_strings + 1), buff, offset))
+    offset += 4 * (n_strings + 1)
+    if len(buff) < offset + blob_size:
+        raise ValueError("Truncated scene file")
+    blob = buff[offset:offset + blob_size]
+    strings = [blob[offsets[i]:offsets[i+1]].decode("utf-8") for i in range(n_strings)]
+
+    ## Columns to python values
+    names = [strings[i] for i in frames["name"]]
+    parents = [strings[i] for i in frames["parent"]]
+    styles = [strings[i] for i in frames["style"]]
+
+    result = {}
+    for name, parent, style, t, o in zip(
+            names, parents, styles, frames["position"], frames["orientation"]):
+        result[name] = {
+            "parent": parent,
+            "style": style,
+            "position": dict(zip("xyz", t)),
+            "orientation": dict(zip("xyzw", o))
+        }
+
+    for row, color, size, package, path in zip(
+            geometry["frame"], geometry["color"],
+            geometry["size"], geometry["package"], geometry["path"]):
+        frame = result[names[row]]
+        dat = dict(zip(SIZE_KEYS[frame["style"]], size))
+        dat["color"] = color
+        if frame["style"] == "mesh":
+            dat["package"] = strings[package]
+            dat["path"] = strings[path]
+        frame["data"] = dat
+
+    return {"frames": result}
+
+
+def load(file_name):
+    with open(file_name, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("Empty scene file")
+        buff = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return decode(buff)
+    finally:
+        buff.close()
+
+
+def dump(data, file_name):
+    '''Writes a scene file, replacing it only once it is complete'''
+    content = encode(data)
+    replace_file(file_name, lambda f: f.write(content))
+
+
+if __name__ == "__main__":
+    from frame_editor import codec_yaml
+
+    if len(sys.argv) != 3:
+        print("Usage: codec_binary.py input{{.yaml|{0}}} output{{.yaml|{0}}}".format(EXTENSION))
+        sys.exit(1)
+
+    source, target = sys.argv[1:]
+    data = (load if source.endswith(EXTENSION) else codec_yaml.load)(source)
+    (dump if target.endswith(EXTENSION) else codec_yaml.dump)(data, target)
+
+# eof
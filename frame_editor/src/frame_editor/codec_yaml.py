@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+import os
+
+import yaml
+
+from frame_editor.utils_file import replace_file
+
+## Use the libyaml bindings if PyYAML has been built with them
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+
+def loads(text):
+    return yaml.load(text, Loader=SafeLoader)
+
+
+def dumps(data):
+    return yaml.dump(data, Dumper=SafeDumper, default_flow_style=False)
+
+
+def load(file_name):
+    '''Reads a frame editor file without going through the parameter server'''
+    with open(file_name, 'r') as f:
+        return yaml.load(f, Loader=SafeLoader)
+
+
+def dump(data, file_name):
+    '''Writes a frame editor file, replacing it only once it is complete'''
+    replace_file(file_name,
+        lambda f: yaml.dump(data, f, Dumper=SafeDumper, default_flow_style=False), 'w')
+
+
+class FragmentCache(object):
+    '''Keeps the yaml text of every frame together with its revision,
+    so only frames which changed since the last save are serialized again.
+
+    Frames are written sorted by name. If the file still holds what was
+    written last, the part before the first changed frame is copied from it.
+    '''
+
+    header = 'frames:\n'
+
+    def __init__(self):
+        self.fragments = {} # name -> (revision, text)
+        self.written = None # (file name, stat, [(name, text)]) of the last write
+
+    def snapshot(self, frames, revision, frame_data):
+        '''Returns (name, revision, text, data) of all frames, where text is
+        None and data holds frame_data(frame) if the frame has to be dumped.
+        revision(frame) gives the revision of a frame.'''
+        fragments = self.fragments
+        snapshot = []
+        for frame in frames:
+            r = revision(frame)
+            fragment = fragments.get(frame.name)
+            if fragment is not None and fragment[0] == r:
+                snapshot.append((frame.name, r, fragment[1], None))
+            else:
+                snapshot.append((frame.name, r, None, frame_data(frame)))
+        return snapshot
+
+    def dumps(self, snapshot):
+        '''Returns the file text of a snapshot, may run in another thread'''
+        fragments = {}
+        for name, r, text, data in snapshot:
+            if text is None:
+                text = dumps({name: data})
+                text = ''.join('  ' + line for line in text.splitlines(True))
+            fragments[name] = (r, text)
+        self.fragments = fragments
+
+        if not fragments:
+            return dumps({'frames': {}})
+        return self.header + ''.join(fragments[name][1] for name in sorted(fragments))
+
+    def write(self, content, file_name, write_file):
+        '''Writes content, the encoded result of the last dumps(), to a temporary
+        file which then replaces file_name, so a crash leaves either file whole.
+        If the file still holds what was written last, its unchanged prefix is
+        copied from it. Falls back to write_file(content, file_name) if the file
+        is not known or copying fails. Returns the length of the copied prefix.'''
+        sections = [(name, self.fragments[name][1]) for name in sorted(self.fragments)]
+        offset = self.unchanged_prefix(file_name, sections)
+        if offset is None:
+            offset = 0
+            write_file(content, file_name)
+        else:
+            def write(f):
+                with open(file_name, 'rb') as old:
+                    copied = self.copy_prefix(old, f, offset)
+                f.seek(copied)
+                f.write(content[copied:])
+            try:
+                replace_file(file_name, write)
+            except (IOError, OSError):
+                offset = 0
+                write_file(content, file_name)
+        self.written = (file_name, self.stat(file_name), sections)
+        return offset
+
+    @staticmethod
+    def copy_prefix(old, f, offset):
+        '''Copies up to offset bytes from the start of old to f within the kernel,
+        returns how many were copied. The rest is taken from content, which
+        holds the same bytes as the file was checked to be unchanged.'''
+        copy_file_range = getattr(os, 'copy_file_range', None) # python >= 3.8, linux
+        copied = 0
+        try:
+            while copy_file_range is not None and copied < offset:
+                n = copy_file_range(old.fileno(), f.fileno(), offset - copied, copied, copied)
+                if not n:
+                    break
+                copied += n
+        except OSError:
+            pass # not supported between these files, write from memory
+        return copied
+
+    def unchanged_prefix(self, file_name, sections):
+        '''Returns the length in bytes of the part of the file that sections
+        would leave as it is, None if the file is not the one written last'''
+        if not sections or self.written is None:
+            return None
+        written_name, written_stat, written_sections = self.written
+        if written_name != file_name or not written_sections or written_stat != self.stat(file_name):
+            return None
+
+        offset = len(self.header)
+        for old, new in zip(written_sections, sections):
+            if old != new:
+                break
+            offset += len(new[1].encode('utf-8'))
+        return offset
+
+    @staticmethod
+    def stat(file_name):
+        try:
+            s = os.stat(file_name)
+        except OSError:
+            return None
+        return (s.st_ino, s.st_size, s.st_mtime)
+
+# eof
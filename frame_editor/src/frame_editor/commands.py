@@ -8,7 +8,7 @@ import tf
 
 from python_qt_binding.QtWidgets import QUndoCommand
 
-from frame_editor.constructors_geometry import FromTransformStamped
+from frame_editor.frame_store import FrameStore
 from frame_editor.objects import *
 
 
@@ -81,6 +81,40 @@ class Command_RemoveElement(QUndoCommand):
             self.editor.add_undo_level(2)
 
 
+class Command_RemoveSubtree(QUndoCommand):
+
+    def __init__(self, editor, element):
+        QUndoCommand.__init__(self, "Remove subtree")
+        self.editor = editor
+
+        self.elements = editor.frames.subtree(element.name)
+
+        if any(e is editor.active_frame for e in self.elements):
+            self.active_element = editor.active_frame
+        else:
+            self.active_element = None
+
+    def redo(self):
+        if self.active_element:
+            self.editor.active_frame = None
+            self.editor.add_undo_level(2)
+
+        for element in self.elements:
+            del self.editor.frames[element.name]
+            element.hidden = True
+        self.editor.add_undo_level(1, self.elements)
+
+    def undo(self):
+        for element in self.elements:
+            self.editor.frames[element.name] = element
+            element.hidden = False
+        self.editor.add_undo_level(1, self.elements)
+
+        if self.active_element:
+            self.editor.active_frame = self.active_element
+            self.editor.add_undo_level(2)
+
+
 class Command_ClearAll(QUndoCommand):
 
     def __init__(self, editor):
@@ -92,15 +126,61 @@ class Command_ClearAll(QUndoCommand):
 
     def redo(self):
         self.editor.active_frame = None
-        self.editor.frames = {}
+        self.editor.frames = FrameStore()
         self.editor.add_undo_level(1+2, self.elements.values())
 
     def undo(self):
+        self.elements.reindex()
         self.editor.active_frame = self.active_element
         self.editor.frames = self.elements
         self.editor.add_undo_level(1+2, self.elements.values())
 
 
+class Command_BulkLoad(QUndoCommand):
+    '''Adds many frames at once by swapping in a prebuilt store.
+    Frames with existing names are replaced.
+    '''
+
+    def __init__(self, editor, elements, text="Import file"):
+        QUndoCommand.__init__(self, text)
+        self.editor = editor
+
+        self.elements = elements
+        self.old_frames = editor.frames
+        self.replaced = [editor.frames[e.name] for e in elements if e.name in editor.frames]
+
+        self.new_frames = FrameStore(editor.frames.items())
+        self.new_frames.update((e.name, e) for e in elements)
+
+        self.active_element = editor.active_frame
+        self.was_active = any(e is self.active_element for e in self.replaced)
+
+    def redo(self):
+        self.new_frames.reindex()
+        self.editor.frames = self.new_frames
+        self.set_hidden(self.replaced, True)
+        self.set_hidden(self.elements, False)
+        if self.was_active:
+            self.editor.active_frame = None
+            self.editor.add_undo_level(2)
+        self.editor.add_undo_level(1, self.replaced + self.elements)
+
+    def undo(self):
+        self.old_frames.reindex()
+        self.editor.frames = self.old_frames
+        self.set_hidden(self.elements, True)
+        self.set_hidden(self.replaced, False)
+        if self.was_active:
+            self.editor.active_frame = self.active_element
+            self.editor.add_undo_level(2)
+        self.editor.add_undo_level(1, self.elements + self.replaced)
+
+    @staticmethod
+    def set_hidden(elements, hidden):
+        for element in elements:
+            element.hidden = hidden
+
+
 class Command_AlignElement(QUndoCommand):
 
     def __init__(self, editor, element, source_name, mode):
@@ -114,9 +194,7 @@ class Command_AlignElement(QUndoCommand):
 
         ## New Pose ##
         ##
-        position, orientation = FromTransformStamped(
-            element.tf_buffer.lookup_transform(
-                element.parent, source_name, rospy.Time(0)))
+        position, orientation = editor.lookup_transform(element.parent, source_name)
 
         ## Position
         pos = list(element.position)
@@ -165,14 +243,15 @@ class Command_CopyElement(QUndoCommand):
         if source_name in self.editor.frames:
             element = copy.deepcopy(self.editor.frames[source_name])
             element.name = new_name
+            if element.has_marker:
+                element.marker_id = Frame.create_new_id()
+                element.update_marker()
         else:
             element = Frame(new_name, parent=parent_name)
         element.parent = parent_name
 
         # Pose
-        position, orientation = FromTransformStamped(
-            element.tf_buffer.lookup_transform(
-                parent_name, source_name, rospy.Time(0)))
+        position, orientation = editor.lookup_transform(parent_name, source_name)
         element.position = position
         element.orientation = orientation
 
@@ -207,9 +286,8 @@ class Command_RebaseElement(QUndoCommand):
         self.old_parent = element.parent
 
         # New Pose
-        self.new_position, self.new_orientation = FromTransformStamped(
-            element.tf_buffer.lookup_transform(
-                new_parent, source_name, rospy.Time(0)))
+        self.new_position, self.new_orientation = editor.lookup_transform(
+            new_parent, source_name)
 
 
     def redo(self):
@@ -338,13 +416,15 @@ class Command_SetParent(QUndoCommand):
         self.element = element
         self.keep_absolute = keep_absolute
 
+        if editor.frames.creates_cycle(element.name, parent_name):
+            raise ValueError("Frame {} can't be a child of its descendant {}".format(element.name, parent_name))
+
         self.new_parent_name = parent_name
         self.old_parent_name = element.parent
 
         if self.keep_absolute:
-            position, orientation = FromTransformStamped(
-                element.tf_buffer.lookup_transform(
-                    parent_name, element.name, rospy.Time(0)))
+            position, orientation = editor.lookup_transform(
+                parent_name, element.name)
             self.new_position = position
             self.new_orientation = orientation
 
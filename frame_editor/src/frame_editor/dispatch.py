@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+import threading
+import time
+import traceback
+
+import rospy
+
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+
+from frame_editor.interface import PendingUpdate
+
+
+class ObserverQueue(object):
+    '''Updates waiting for one observer and the thread delivering them.
+
+    Updates which arrive while the observer is busy are merged into a single
+    PendingUpdate, so the queue never holds more than one update and its size
+    is bounded by the number of frames, not by the number of commands.
+    '''
+
+    def __init__(self, editor, observer):
+        self.editor = editor
+        self.observer = observer
+        self.name = type(observer).__name__
+
+        self.condition = threading.Condition()
+        self.pending = PendingUpdate()
+
+        ## Metrics
+        self.depth = 0 # updates merged into pending
+        self.oldest = None # time the oldest of them arrived
+        self.delivering = None # arrival time of the update being delivered
+        self.delivered = 0
+        self.lag = 0.0 # from arrival to completed delivery, last update
+        self.max_lag = 0.0
+
+        self.thread = threading.Thread(target=self.run, name='frame_editor_' + self.name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, level, elements, state):
+        with self.condition:
+            self.pending.add(level, elements, state)
+            self.depth += 1
+            if self.oldest is None:
+                self.oldest = time.time()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.depth:
+                    self.condition.wait()
+                level, elements, state = self.pending.take()
+                since = self.delivering = self.oldest
+                self.depth = 0
+                self.oldest = None
+
+            if level or elements:
+                try:
+                    self.observer.update(self.editor, level, elements, state)
+                except Exception as e:
+                    print("> Updating {} failed: {}".format(self.name, e))
+                    traceback.print_exc()
+
+            lag = time.time() - since
+            with self.condition:
+                self.delivering = None
+                self.delivered += 1
+                self.lag = lag
+                self.max_lag = max(self.max_lag, lag)
+
+    def metrics(self):
+        with self.condition:
+            since = self.delivering if self.delivering is not None else self.oldest
+            waiting = time.time() - since if since is not None else 0.0
+            return {
+                "depth": self.depth,
+                "lag": max(self.lag, waiting),
+                "max_lag": max(self.max_lag, waiting),
+                "delivered": self.delivered
+            }
+
+
+class Dispatcher(object):
+    '''Hands observer updates to a worker thread per observer.
+
+    Observers with synchronous set are still called in the thread of the
+    command, the others no longer delay it. Queue depth and lag of every
+    observer are published on /diagnostics every diagnostics_period.
+    '''
+
+    def __init__(self, editor, diagnostics_period=1.0, warn_lag=1.0):
+        self.editor = editor
+        self.diagnostics_period = diagnostics_period
+        self.warn_lag = warn_lag
+        self.queues = {} # id(observer) -> ObserverQueue
+        self.lock = threading.Lock() # commands and file jobs dispatch from different threads
+
+        self.publisher = rospy.Publisher("/diagnostics", DiagnosticArray, queue_size=1)
+        self.editor.scheduler.add_job(
+            self.publish_metrics, lambda: self.diagnostics_period, needs_work=lambda: bool(self.queues))
+
+    def dispatch(self, observers, level, elements, state):
+        '''Called from the thread of a command or file job, or of undo/redo in
+        the gui, which does not hold the command lock.
+        Observers which run later check state, not the editor.'''
+        for observer in observers:
+            if getattr(observer, "synchronous", False):
+                observer.update(self.editor, level, elements, state)
+                continue
+            queue = self.queues.get(id(observer))
+            if queue is None:
+                queue = self.queue(observer)
+            queue.put(level, elements, state)
+
+    def queue(self, observer):
+        '''Returns the queue of an observer, created on its first update'''
+        with self.lock:
+            queue = self.queues.get(id(observer))
+            if queue is None:
+                queue = self.queues[id(observer)] = ObserverQueue(self.editor, observer)
+            return queue
+
+    def metrics(self):
+        '''Returns observer name -> dict of depth, lag, max_lag and delivered'''
+        with self.lock:
+            queues = list(self.queues.values())
+        return dict((queue.name, queue.metrics()) for queue in queues)
+
+    def publish_metrics(self):
+        array = DiagnosticArray()
+        array.header.stamp = rospy.Time.now()
+        for name, metrics in sorted(self.metrics().items()):
+            status = DiagnosticStatus()
+            status.name = "frame_editor: {} updates".format(name)
+            status.hardware_id = rospy.get_name()
+            if metrics["lag"] > self.warn_lag:
+                status.level = DiagnosticStatus.WARN
+                status.message = "Lagging behind"
+            else:
+                status.level = DiagnosticStatus.OK
+                status.message = "OK"
+            status.values = [KeyValue(key, str(value)) for key, value in sorted(metrics.items())]
+            array.status.append(status)
+        self.publisher.publish(array)
+
+# eof
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import hashlib
 import os
 import sys
 
@@ -16,6 +17,15 @@ from frame_editor.commands import *
 
 from frame_editor.constructors_geometry import *
 from frame_editor.constructors_std import *
+from frame_editor.frame_store import FrameStore
+from frame_editor.interface import UpdateState
+from frame_editor.io_worker import IOWorker
+from frame_editor.journal import Journal
+from frame_editor.pose_table import poses
+from frame_editor.scheduler import Scheduler
+from frame_editor.utils_file import replace_file
+from frame_editor import codec_binary, codec_yaml, utils_rospkg, utils_tf
+from frame_editor.dispatch import Dispatcher
 
 from python_qt_binding import QtCore
 from python_qt_binding.QtWidgets import QUndoStack
@@ -33,20 +43,51 @@ class FrameEditor(QtCore.QObject):
         Frame.init_tf()
         super(FrameEditor, self).__init__()
 
-        self.frames = {}
+        self.frames = FrameStore()
         self.active_frame = None
 
         ## Undo/Redo
         self.observers = []
         self.undo_level = 0
         self.undo_elements = []
+        self.undo_commands = [] # names of the commands in the undo level, for the journal
         self.undo_stack = QUndoStack()
-        self.undo_stack.indexChanged.connect(self.undo_stack_changed)
+        ## Direct, so commands of other threads are dispatched while they are
+        ## pushed, the headless editor has no event loop for queued slots
+        self.undo_stack.indexChanged.connect(self.undo_stack_changed, QtCore.Qt.DirectConnection)
         self.__command_lock = threading.Lock()
+        self.command_name = None # name of the command being pushed, for the journal
+
+        ## Broadcasting
+        self.scheduler = Scheduler()
+
+        ## Slow observers are updated from their own threads
+        self.dispatcher = Dispatcher(self)
+
+        ## Frames no longer sent on tf are dropped from the inventory
+        self.scheduler.add_job(
+            lambda: Frame.tf_inventory.expire(rospy.Time.now().to_sec()),
+            lambda: Frame.tf_cache_time / 4.0,
+            needs_work=lambda: len(Frame.tf_inventory) > 0)
 
         self.namespace = "frame_editor"
         self.full_file_path = None
         self.hz = 200
+        self.keep_alive = 0.1
+        self.static_tf = False
+        self.mirror_params = False
+
+        ## Last save as (file name, frames revision, content digest)
+        self.saved_file = (None, None, None)
+        self.yaml_fragments = codec_yaml.FragmentCache()
+
+        ## File jobs run in the background, observers get level 8 when one is done
+        self.io_worker = IOWorker(self.io_job_done)
+        self.io_error = None
+        self.io_finisher = None # set by a gui to run job.finish in its thread
+
+        ## Crash recovery, see parse_args
+        self.journal = None
 
 
     def get_file_name(self):
@@ -71,35 +112,66 @@ class FrameEditor(QtCore.QObject):
     def add_undo_level(self, level, elements=None):
         '''Used by commands to add a level for updating'''
         self.undo_level = self.undo_level | level
+        if self.command_name is not None and self.command_name not in self.undo_commands:
+            self.undo_commands.append(self.command_name)
         if elements:
+            if level & (1 | 4): # selection changes leave the frames and revisions alone
+                self.frames.touch(elements)
             self.undo_elements.extend(elements)
 
     def command(self, command):
         '''Push a command to the stack (blocking)'''
         with self.__command_lock:
+            self.command_name = type(command).__name__
             self.undo_stack.push(command)
+            self.command_name = None
+
+    def command_macro(self, text, commands):
+        '''Push several commands as a single undo step (blocking)'''
+        with self.__command_lock:
+            self.command_name = text
+            self.undo_stack.beginMacro(text)
+            for command in commands:
+                self.undo_stack.push(command)
+            self.undo_stack.endMacro()
+            self.command_name = None
 
 
     def update_obsevers(self, level):
         '''Updates all registered observers and resets the undo_level'''
-        for observer in self.observers:
-            observer.update(self, level, self.undo_elements)
+        self.dispatcher.dispatch(self.observers, level, self.undo_elements,
+                                 self.update_state(", ".join(self.undo_commands) or None))
         self.undo_level = 0
         self.undo_elements = []
+        self.undo_commands = []
+        self.scheduler.wake()
+
+    def update_state(self, command=None):
+        '''Returns the state observers need if they are updated later'''
+        return UpdateState(command, self.active_frame, not self.frames)
+
+    def io_job_done(self, job):
+        '''Called from the io worker, tells observers that a file job is done.
+        A successful job is finished in the thread given by io_finisher, as the
+        undo stack and the file name belong to the gui thread if there is one.'''
+        if job.error is not None:
+            self.io_error = "{} failed: {}".format(job.name, job.error)
+        if self.io_finisher is not None:
+            self.io_finisher(job.finish)
+        else:
+            job.finish()
+        with self.__command_lock:
+            self.dispatcher.dispatch(self.observers, 8, [], self.update_state())
 
-    def broadcast(self):
-        for observer in self.observers:
-            observer.broadcast(self)
+    def lookup_transform(self, target_frame, source_frame):
+        '''Returns (position, orientation) of source_frame relative to target_frame,
+        resolving frames of the editor without waiting for tf'''
+        return utils_tf.lookup_transform(
+            self.frames, Frame.tf_buffer, target_frame, source_frame)
 
     @staticmethod
-    def tf_dict():
-        y = Frame.tf_buffer.all_frames_as_yaml()
-        d = yaml.load(y)
-        if isinstance(d, dict):
-            return d
-        else:
-            rospy.logwarn('Got invalid yaml from tf2: '+y)
-            return {}
+    def tf_inventory():
+        return Frame.tf_inventory
 
     @staticmethod
     def frame_is_temporary(frame_id):
@@ -107,11 +179,15 @@ class FrameEditor(QtCore.QObject):
 
     @staticmethod
     def all_frame_ids(include_temp=True):
-        return [f for f in FrameEditor.tf_dict() if
+        '''Returns the sorted ids of all frames known to tf'''
+        return [f for f in Frame.tf_inventory.ids() if
                 not FrameEditor.frame_is_temporary(f) or include_temp]
 
+    def frame_id_exists(self, name):
+        return name in self.frames or name in Frame.tf_inventory
+
     def iter_frames(self, include_temp=True):
-        for f in self.frames.itervalues():
+        for f in self.frames.values():
             if not self.frame_is_temporary(f.name) or include_temp:
                 yield f
 
@@ -128,18 +204,49 @@ class FrameEditor(QtCore.QObject):
     ## FILE I/O ##
     ##
     def load_file(self, file_name):
+        '''Loads a file and waits for it, raises if loading failed'''
+        return self.load_file_async(file_name).wait()
+
+    def load_file_async(self, file_name):
+        '''Queues loading a file, returns the IOJob'''
+        return self.io_worker.submit("Loading", lambda: self.read_file(file_name),
+            lambda result: self.file_loaded(file_name))
+
+    def read_file(self, file_name):
         if file_name:
             print("> Loading file")
-            data = rosparam.load_file(file_name, self.namespace)[0][0]
+            try:
+                data = self.file_codec(file_name).load(file_name)
+            except yaml.constructor.ConstructorError:
+                ## Files with rosparam specific tags like !degrees
+                data = rosparam.load_file(file_name, self.namespace)[0][0]
             self.load_data(data)
         else:
             ## Clear everything
             self.command(Command_ClearAll(self))
+        return True
 
-        self.undo_stack.clear()
+    def file_loaded(self, file_name):
+        '''Finishes loading, the loaded frames become the clean state'''
+        with self.__command_lock:
+            self.undo_stack.clear()
+            self.full_file_path = file_name
+            if self.journal is not None:
+                self.journal.reset(file_name)
 
-        self.full_file_path = file_name
-        return True
+    def file_saved(self, file_name, index):
+        '''Finishes saving, the stack is clean unless commands came in meanwhile'''
+        with self.__command_lock:
+            self.full_file_path = file_name
+            if self.undo_stack.index() == index:
+                self.undo_stack.setClean()
+
+    @staticmethod
+    def file_codec(file_name):
+        '''Returns the codec module for a file, chosen by its extension'''
+        if file_name.endswith(codec_binary.EXTENSION):
+            return codec_binary
+        return codec_yaml
 
     def load_params(self, namespace):
         if not rosparam.list_params(namespace):
@@ -150,9 +257,8 @@ class FrameEditor(QtCore.QObject):
 
     def load_data(self, data):
 
-        self.undo_stack.beginMacro("Import file")
-
         ## Import data
+        elements = []
         for name, frame in data["frames"].items():
             t = frame["position"]
             o = frame["orientation"]
@@ -192,71 +298,147 @@ class FrameEditor(QtCore.QObject):
             else:
                 f = Frame(name, position, orientation, frame["parent"])
 
-            self.command(Command_AddElement(self, f))
+            elements.append(f)
 
-        self.undo_stack.endMacro()
+        ## All frames are swapped in by a single command
+        self.command(Command_BulkLoad(self, elements))
 
         print("> Loading done")
 
-    def save_file(self, filename):
+    @staticmethod
+    def frame_data(frame, position=None, orientation=None):
+        '''Returns a frame in the file format, with its pose if none is given'''
+        if position is None:
+            position = frame.position
+        if orientation is None:
+            orientation = frame.orientation
+        t = dict(zip("xyz", (float(v) for v in position)))
+        o = dict(zip("xyzw", (float(v) for v in orientation)))
 
-        ## Data
-        data = {}
-        frames = {}
+        f = {}
+        f["parent"] = frame.parent
+        f["position"] = t
+        f["orientation"] = o
 
-        for frame in self.iter_frames(include_temp=False):
-            t = {}
-            t["x"] = float(frame.position[0])
-            t["y"] = float(frame.position[1])
-            t["z"] = float(frame.position[2])
+        f["style"] = frame.style
 
-            o = {}
-            o["x"] = float(frame.orientation[0])
-            o["y"] = float(frame.orientation[1])
-            o["z"] = float(frame.orientation[2])
-            o["w"] = float(frame.orientation[3])
+        if frame.style == "plane":
+            f["data"] = { "length": frame.length, "width":frame.width, "color": frame.color }
 
-            f = {}
-            f["parent"] = frame.parent
-            f["position"] = t
-            f["orientation"] = o
+        elif frame.style == "cube":
+            f["data"] = { "length": frame.length, "width": frame.width, "height": frame.height , "color": frame.color}
 
-            f["style"] = frame.style
+        elif frame.style == "sphere":
+            f["data"] = { "diameter": frame.diameter, "color": frame.color }
 
-            if frame.style == "plane":
-                f["data"] = { "length": frame.length, "width":frame.width, "color": frame.color }
+        elif frame.style == "axis":
+            f["data"] = { "length": frame.length, "width": frame.width, "color": frame.color }
 
-            elif frame.style == "cube":
-                f["data"] = { "length": frame.length, "width": frame.width, "height": frame.height , "color": frame.color}
+        elif frame.style == "mesh":
+            f["data"] = { "package" : frame.package, "path" : frame.path, "scale" : frame.scale, "color": frame.color }
 
-            elif frame.style == "sphere":
-                f["data"] = { "diameter": frame.diameter, "color": frame.color }
+        return f
 
-            elif frame.style == "axis":
-                f["data"] = { "length": frame.length, "width": frame.width, "color": frame.color }
+    def to_data(self, frames):
+        '''Returns the given frames in the file format'''
+        frames = list(frames)
 
-            elif frame.style == "mesh":
-                self.update_file_format(frame)
-                f["data"] = { "package" : frame.package, "path" : frame.path, "scale" : frame.scale, "color": frame.color }
+        ## Poses of all frames in one go from the pose table
+        translations, rotations = poses.gather([frame._row for frame in frames])
 
-            frames[frame.name] = f
+        data = {}
+        data["frames"] = dict(
+            (frame.name, self.frame_data(frame, t, o))
+            for frame, t, o in zip(frames, translations.tolist(), rotations.tolist()))
+        return data
 
-        data["frames"] = frames
+    def export_subtree(self, name):
+        '''Returns a frame and all its descendants in the file format'''
+        with self.__command_lock:
+            return self.to_data(
+                f for f in self.frames.subtree(name) if not self.frame_is_temporary(f.name))
 
-        ## To parameter server
-        rospy.set_param(self.namespace, data)
-        print(rospy.get_param(self.namespace))
+    def export_subtree_async(self, name, filename):
+        '''Queues writing a frame and its descendants to another file, returns the IOJob.
+        Unlike saving, the file name and clean state of the editor are kept.'''
+        data = self.export_subtree(name)
+        codec = self.file_codec(filename)
+        return self.io_worker.submit("Exporting", lambda: codec.dump(data, filename))
+
+    def save_file(self, filename):
+        '''Saves to a file and waits for it, raises if saving failed'''
+        return self.save_file_async(filename).wait()
+
+    def save_file_async(self, filename):
+        '''Takes a snapshot of the frames and queues writing it, returns the IOJob'''
+
+        ## Data
+        for frame in self.iter_frames(include_temp=False):
+            if frame.style == "mesh":
+                self.update_file_format(frame)
 
-        ## Dump param to file
         if filename == '':
             filename = self.full_file_path
-        print("Saving to file {}".format(filename))
-        rosparam.dump_params(filename, self.namespace)
-        print("Saving done")
 
-        self.full_file_path = filename
+        ## Snapshot, only data of frames changed since the last save is copied
+        codec = self.file_codec(filename)
+        with self.__command_lock:
+            frames = list(self.iter_frames(include_temp=False))
+            revision = self.frames.revision
+            if (filename, revision) == self.saved_file[:2] and os.path.exists(filename):
+                snapshot = None # nothing changed since the last save
+            elif codec is codec_binary:
+                snapshot = self.to_data(frames)
+            else:
+                snapshot = self.yaml_fragments.snapshot(frames,
+                    lambda frame: self.frames.frame_revision(frame.name),
+                    self.frame_data)
+            params = self.to_data(frames) if self.mirror_params else None
+            journal_seq = self.journal.seq if self.journal is not None else None
+            index = self.undo_stack.index()
+
+        return self.io_worker.submit("Saving",
+            lambda: self.write_snapshot(filename, revision, codec, snapshot, params, journal_seq),
+            lambda result: self.file_saved(filename, index))
+
+    def write_snapshot(self, filename, revision, codec, snapshot, params, journal_seq=None):
+        '''Writes a snapshot unless the file already has its content'''
+        saved_name, saved_revision, saved_digest = self.saved_file
+        if snapshot is None:
+            print("No changes to save to file {}".format(filename))
+        else:
+            if codec is codec_binary:
+                content = codec_binary.encode(snapshot)
+            else:
+                content = self.yaml_fragments.dumps(snapshot)
+                if not isinstance(content, bytes):
+                    content = content.encode('utf-8')
+
+            digest = hashlib.sha1(content).hexdigest()
+            if (filename, digest) == (saved_name, saved_digest) and os.path.exists(filename):
+                print("File {} is up to date".format(filename))
+            else:
+                print("Saving to file {}".format(filename))
+                if codec is codec_binary:
+                    self.write_file(content, filename)
+                else:
+                    self.yaml_fragments.write(content, filename, self.write_file)
+                print("Saving done")
+            self.saved_file = (filename, revision, digest)
+
+        if journal_seq is not None:
+            self.journal.saved(filename, journal_seq)
+
+        ## To parameter server
+        if params is not None:
+            rospy.set_param(self.namespace, params)
         return True
 
+    @staticmethod
+    def write_file(content, filename):
+        '''Writes a file, replacing it only once it is complete'''
+        replace_file(filename, lambda f: f.write(content))
+
     def update_file_format(self, frame):
         if frame.package == "" and frame.path != "":
             try:
@@ -265,7 +447,7 @@ class FrameEditor(QtCore.QObject):
                 from python_qt_binding import QtWidgets
                 rospackage = rospkg.get_package_name(frame.path)
                 if rospackage is not None:
-                    rel_path = os.path.relpath(frame.path , rospkg.RosPack().get_path(rospackage))
+                    rel_path = os.path.relpath(frame.path , utils_rospkg.get_path(rospackage))
                     reply = QtWidgets.QMessageBox.question(None, "Convert absolute path to rospack+relative path?",
                     "The absolute path to your selected mesh can be converted to rospack+relative path."+
                     "This gives you more reliabilaty to reuse your saved configuration"+
@@ -280,6 +462,7 @@ class FrameEditor(QtCore.QObject):
                         print("Saving: package: {} + relative path: {}".format(rospackage, rel_path))
                         frame.package = rospackage
                         frame.path = rel_path
+                        self.frames.touch([frame])
                         return
             except:
                 # Do nothing if conversion fails
@@ -290,10 +473,9 @@ class FrameEditor(QtCore.QObject):
 
     def run(self):
         print("> Going for some spins")
-        rate = rospy.Rate(self.hz) # hz
+        rospy.on_shutdown(self.scheduler.wake)
         while not rospy.is_shutdown():
-            self.broadcast()
-            rate.sleep()
+            self.scheduler.spin_once()
 
     def parse_args(self, argv):
         ## Args ##
@@ -307,8 +489,16 @@ class FrameEditor(QtCore.QObject):
         #              help="Put plugin in silent mode")
         parser.add_argument("-l", "--load", action="append",
                       dest="file",
-                      help="Load a file at startup. [rospack filepath/file]")
+                      help="Load a .yaml or .fes file at startup. [rospack filepath/file]")
         parser.add_argument("-r", "--rate", type=int)
+        parser.add_argument("-k", "--keep_alive", type=float,
+                      help="Period in seconds to resend frames which have not been changed (default 0.1)")
+        parser.add_argument("-s", "--static_tf", action="store_true",
+                      help="Publish frames which are not being edited on /tf_static")
+        parser.add_argument("-p", "--mirror_params", action="store_true",
+                      help="Also set saved frames on the parameter server")
+        parser.add_argument("-j", "--journal",
+                      help="Journal file to record unsaved changes in and to recover them from")
 
         args, unknowns = parser.parse_known_args(argv)
         print('arguments: {}'.format(args))
@@ -317,8 +507,15 @@ class FrameEditor(QtCore.QObject):
 
         if args.rate:
             self.hz = args.rate
+        if args.keep_alive:
+            self.keep_alive = args.keep_alive
+        if args.static_tf:
+            self.static_tf = True
+        if args.mirror_params:
+            self.mirror_params = True
 
         ## Load file ##
+        result = None
         if args.file:
             arg_path = args.file[0].split()
             if len(arg_path) == 1:
@@ -328,8 +525,7 @@ class FrameEditor(QtCore.QObject):
                 success = self.load_file(str(filename))
             elif len(arg_path) == 2:
                 #load rospack
-                rospack = rospkg.RosPack()
-                filename = os.path.join(rospack.get_path(arg_path[0]), arg_path[1])
+                filename = os.path.join(utils_rospkg.get_path(arg_path[0]), arg_path[1])
                 print("Loading {}".format(filename))
                 success = self.load_file(str(filename))
             else:
@@ -339,10 +535,24 @@ class FrameEditor(QtCore.QObject):
                 success = None
 
             if success:
-                return filename
-            elif success == False:
-                print("ERROR LOADING FILE")
-            return ''
+                result = filename
+            else:
+                if success == False:
+                    print("ERROR LOADING FILE")
+                result = ''
+
+        ## Journal ##
+        if args.journal:
+            self.start_journal(os.path.expanduser(args.journal))
+
+        return result
+
+    def start_journal(self, path):
+        '''Recovers unsaved changes from the journal and records new ones'''
+        journal = Journal(self, path)
+        recovered = journal.recover()
+        journal.start(snapshot=recovered)
+        self.journal = journal
 
     def init_views(self):
         ## Views
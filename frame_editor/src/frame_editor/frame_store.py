@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+import itertools
+import threading
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+import numpy
+
+from frame_editor import utils_tf
+
+## Revisions are unique across all stores, so a revision seen once
+## always refers to the same content
+_revisions = itertools.count(1)
+
+
+class FrameStore(MutableMapping):
+    '''Maps names to frames and keeps an index of each frame's children.
+
+    Adding and removing frames updates the index directly, changed parents
+    are picked up by touch(), which the editor calls for every element a
+    command reports. Hierarchy queries then cost O(subtree) instead of a
+    scan over all frames.
+
+    Transforms relative to the first foreign ancestor are cached per frame
+    and invalidated only for the subtree below a changed frame.
+
+    Every change assigns a new revision to the changed frame and the store,
+    which lets savers skip frames or whole files that did not change.
+    '''
+
+    def __init__(self, frames=None):
+        self._frames = {}
+        self._parents = {} # name -> parent name as indexed
+        self._children = {} # parent name -> set of child names
+        self._root_transforms = {} # name -> (root name, matrix)
+        self._revisions = {} # name -> revision of the last change
+        self.revision = next(_revisions)
+        self._lock = threading.RLock()
+        if frames:
+            self.update(frames)
+
+    ## Mapping ##
+    ##
+    def __getitem__(self, name):
+        return self._frames[name]
+
+    def __setitem__(self, name, frame):
+        with self._lock:
+            if name in self._frames:
+                self._unlink(name)
+            self._frames[name] = frame
+            self._link(name, frame.parent)
+            self._invalidate(name, force=True)
+            self._changed(name)
+
+    def __delitem__(self, name):
+        with self._lock:
+            del self._frames[name]
+            self._unlink(name)
+            self._invalidate(name, force=True)
+            del self._revisions[name]
+            self.revision = next(_revisions)
+
+    def __contains__(self, name):
+        return name in self._frames
+
+    def __iter__(self):
+        return iter(list(self._frames))
+
+    def __len__(self):
+        return len(self._frames)
+
+    ## Copies, so other threads may change the store while they are iterated
+    def keys(self):
+        return list(self._frames.keys())
+
+    def values(self):
+        return list(self._frames.values())
+
+    def items(self):
+        return list(self._frames.items())
+
+    ## Index ##
+    ##
+    def _link(self, name, parent):
+        self._parents[name] = parent
+        self._children.setdefault(parent, set()).add(name)
+
+    def _unlink(self, name):
+        parent = self._parents.pop(name)
+        children = self._children[parent]
+        children.discard(name)
+        if not children:
+            del self._children[parent]
+
+    def touch(self, elements):
+        '''Updates the index for elements which have been changed by a command'''
+        with self._lock:
+            for element in elements:
+                if element is None:
+                    continue
+                name = element.name
+                if self._frames.get(name) is not element:
+                    continue
+                if self._parents[name] != element.parent:
+                    self._unlink(name)
+                    self._link(name, element.parent)
+                self._invalidate(name)
+                self._changed(name)
+
+    def reindex(self):
+        '''Rebuilds the index and drops all cached transforms. Needed when a
+        store is swapped back in, its frames may have been changed meanwhile.'''
+        with self._lock:
+            self._parents = {}
+            self._children = {}
+            self._root_transforms = {}
+            for name, frame in self._frames.items():
+                self._link(name, frame.parent)
+                self._changed(name)
+
+    def _changed(self, name):
+        self.revision = next(_revisions)
+        self._revisions[name] = self.revision
+
+    def frame_revision(self, name):
+        '''Returns the revision of the last change of a frame'''
+        return self._revisions[name]
+
+    def _invalidate(self, name, force=False):
+        '''Drops the cached transforms of name and its descendants.
+        A frame is only cached if its parent is, so uncached frames end the walk.'''
+        if self._root_transforms.pop(name, None) is None and not force:
+            return
+        stack = list(self._children.get(name, ()))
+        while stack:
+            child = stack.pop()
+            if self._root_transforms.pop(child, None) is not None:
+                stack.extend(self._children.get(child, ()))
+
+    ## Hierarchy ##
+    ##
+    def children(self, name):
+        '''Returns the names of all direct children of name'''
+        return set(self._children.get(name, ()))
+
+    def subtree(self, name):
+        '''Returns the frame name and all its descendants, parents first'''
+        if name not in self._frames:
+            return []
+        frames = [self._frames[name]]
+        visited = set([name])
+        for frame in frames:
+            for child in self._children.get(frame.name, ()):
+                if child not in visited:
+                    visited.add(child)
+                    frames.append(self._frames[child])
+        return frames
+
+    def root_transform(self, name):
+        '''Returns (root, matrix) of name relative to its first ancestor
+        which is not in the store'''
+        with self._lock:
+            ## Walk up to the first cached or foreign frame
+            chain = []
+            visited = set()
+            while name in self._frames and name not in self._root_transforms:
+                if name in visited:
+                    raise RuntimeError('Cyclic parents at frame {}'.format(name))
+                visited.add(name)
+                chain.append(name)
+                name = self._frames[name].parent
+
+            if name in self._root_transforms:
+                root, matrix = self._root_transforms[name]
+            else:
+                root, matrix = name, numpy.identity(4)
+
+            ## Compose and cache down the chain
+            for name in reversed(chain):
+                frame = self._frames[name]
+                matrix = numpy.dot(matrix, utils_tf.pose_matrix(frame.position, frame.orientation))
+                self._root_transforms[name] = (root, matrix)
+
+            return root, matrix
+
+    def creates_cycle(self, name, parent):
+        '''True if parent is name itself or one of its descendants'''
+        visited = set()
+        while parent not in visited:
+            if parent == name:
+                return True
+            if parent not in self._frames:
+                return False
+            visited.add(parent)
+            parent = self._parents[parent]
+        return True
+
+# eof
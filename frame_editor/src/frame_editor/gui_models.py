@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+import bisect
+
+from python_qt_binding.QtCore import Qt, QAbstractItemModel, QAbstractListModel, QModelIndex
+
+
+class FrameListModel(QAbstractListModel):
+    '''Sorted list of frame names.
+
+    Rows are found by bisection, so adding or removing a frame costs
+    O(log n) plus a single insert/remove signal instead of rebuilding
+    the list. Filtering is left to a QSortFilterProxyModel.
+    '''
+
+    ## Above this number of changes a reset is cheaper than single signals
+    reset_threshold = 100
+
+    def __init__(self, parent=None):
+        super(FrameListModel, self).__init__(parent)
+        self.names = []
+
+    ## Model ##
+    ##
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid() and index.row() < len(self.names):
+            return self.names[index.row()]
+        return None
+
+    ## Lookup ##
+    ##
+    def row(self, name):
+        '''Returns the row of name or -1'''
+        row = bisect.bisect_left(self.names, name)
+        if row < len(self.names) and self.names[row] == name:
+            return row
+        return -1
+
+    def index_of(self, name):
+        row = self.row(name)
+        if row < 0:
+            return QModelIndex()
+        return self.index(row, 0)
+
+    ## Updates ##
+    ##
+    def set_names(self, names):
+        self.beginResetModel()
+        self.names = sorted(names)
+        self.endResetModel()
+
+    def update_names(self, names, frames):
+        '''Adds or removes the given names depending on whether they are in frames'''
+        names = set(names)
+        if len(names) > self.reset_threshold:
+            self.set_names(frames.keys())
+            return
+
+        for name in sorted(names):
+            row = bisect.bisect_left(self.names, name)
+            listed = row < len(self.names) and self.names[row] == name
+            if name in frames and not listed:
+                self.beginInsertRows(QModelIndex(), row, row)
+                self.names.insert(row, name)
+                self.endInsertRows()
+            elif listed and name not in frames:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.names[row]
+                self.endRemoveRows()
+
+
+class FrameTreeNode(object):
+    '''Stable object behind the model indices of a frame'''
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class FrameTreeModel(QAbstractItemModel):
+    '''Frame hierarchy given as a dict of frame -> parent.
+
+    Children are kept as sorted name lists for all frames, but rows are only
+    shown to views for the roots and for frames which have been expanded
+    (fetchMore). Changes are applied as single row inserts and removes and
+    only cost signals for the parts of the tree that have been expanded.
+    '''
+
+    def __init__(self, parent=None):
+        super(FrameTreeModel, self).__init__(parent)
+        self.parents = {} # name -> parent name, roots are missing
+        self.children = {None: []} # parent name (None for roots) -> sorted names
+        self.fetched = set() # names whose children are shown
+        self.fetching = set()
+        self.nodes = {}
+
+    def node(self, name):
+        node = self.nodes.get(name)
+        if node is None:
+            node = self.nodes[name] = FrameTreeNode(name)
+        return node
+
+    def name(self, index):
+        return index.internalPointer().name if index.isValid() else None
+
+    def shown(self, name):
+        '''True if the children of name are rows of the model'''
+        return name is None or name in self.fetched
+
+    ## Model ##
+    ##
+    def index(self, row, column, parent=QModelIndex()):
+        children = self.children.get(self.name(parent), ())
+        if column != 0 or row < 0 or row >= len(children):
+            return QModelIndex()
+        return self.createIndex(row, 0, self.node(children[row]))
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.index_of(self.parents.get(index.internalPointer().name))
+
+    def index_of(self, name):
+        '''Returns the index of name, which has to be shown'''
+        if name is None:
+            return QModelIndex()
+        row = bisect.bisect_left(self.children[self.parents.get(name)], name)
+        return self.createIndex(row, 0, self.node(name))
+
+    def rowCount(self, parent=QModelIndex()):
+        name = self.name(parent)
+        if not self.shown(name):
+            return 0
+        return len(self.children.get(name, ()))
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        return bool(self.children.get(self.name(parent)))
+
+    def canFetchMore(self, parent):
+        name = self.name(parent)
+        return not self.shown(name) and name not in self.fetching and bool(self.children.get(name))
+
+    def fetchMore(self, parent):
+        name = self.name(parent)
+        if self.shown(name) or name in self.fetching:
+            return
+        count = len(self.children.get(name, ()))
+        if not count:
+            self.fetched.add(name)
+            return
+        ## Views may ask again while they are told about the new rows
+        self.fetching.add(name)
+        self.beginInsertRows(parent, 0, count - 1)
+        self.fetched.add(name)
+        self.endInsertRows()
+        self.fetching.discard(name)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return index.internalPointer().name
+        return None
+
+    ## Updates ##
+    ##
+    def set_parents(self, parents):
+        '''Replaces the whole tree'''
+        self.beginResetModel()
+        self.parents = dict(parents)
+        self.children = {None: []}
+        self.fetched = set()
+        self.nodes = {}
+        for name, parent in self.parents.items():
+            self.children.setdefault(parent, []).append(name)
+        self.children[None] = [name for name in self.children
+                               if name is not None and name not in self.parents]
+        for children in self.children.values():
+            children.sort()
+        self.endResetModel()
+
+    def update_parents(self, parents, changed=None):
+        '''Applies a new dict of frame -> parent. If the names which might
+        have changed are known, only these are compared.'''
+        if not self.parents and changed is None:
+            self.set_parents(parents)
+            return
+        if changed is None:
+            changed = set(self.parents) | set(parents)
+
+        ## Names which may have become or stopped being roots
+        check = set()
+
+        for name in changed:
+            old = self.parents.get(name)
+            if old is not None and old != parents.get(name):
+                self.remove_row(name, old)
+                del self.parents[name]
+                check.update((name, old))
+
+        for name in changed:
+            new = parents.get(name)
+            if new is not None and self.parents.get(name) != new:
+                if self.is_root(name):
+                    self.remove_row(name, None)
+                self.parents[name] = new
+                self.insert_row(name, new)
+                check.add(new)
+
+        for name in check:
+            root = name not in self.parents and bool(self.children.get(name))
+            if root and not self.is_root(name):
+                self.insert_row(name, None)
+            elif not root and self.is_root(name):
+                self.remove_row(name, None)
+
+    def is_root(self, name):
+        roots = self.children[None]
+        row = bisect.bisect_left(roots, name)
+        return row < len(roots) and roots[row] == name
+
+    def remove_row(self, name, parent):
+        children = self.children[parent]
+        row = bisect.bisect_left(children, name)
+        if self.shown(parent):
+            self.beginRemoveRows(self.index_of(parent), row, row)
+            del children[row]
+            self.endRemoveRows()
+        else:
+            del children[row]
+        if not children and parent is not None:
+            del self.children[parent]
+        self.forget(name)
+
+    def insert_row(self, name, parent):
+        children = self.children.setdefault(parent, [])
+        row = bisect.bisect_left(children, name)
+        if self.shown(parent):
+            self.beginInsertRows(self.index_of(parent), row, row)
+            children.insert(row, name)
+            self.endInsertRows()
+        else:
+            children.insert(row, name)
+
+    def forget(self, name):
+        '''Collapses name and its shown descendants after its row has been removed'''
+        stack = [name]
+        while stack:
+            name = stack.pop()
+            if name in self.fetched:
+                self.fetched.discard(name)
+                stack.extend(self.children.get(name, ()))
+
+# eof
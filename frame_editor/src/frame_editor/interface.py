@@ -1,16 +1,102 @@
 #!/usr/bin/env python
 
-from python_qt_binding.QtCore import QObject
+import threading
+
+from python_qt_binding.QtCore import QObject, QTimer, Signal, Slot
 
 class Interface(QObject):
 
+    ## Synchronous observers are updated in the thread of the command,
+    ## all others get merged updates from their own worker (see dispatch.py)
+    synchronous = False
+
     def __init__(self, frame_editor):
         super(QObject, self).__init__()
 
-    def update(self, editor, level, elements):
+    def update(self, editor, level, elements, state):
+        '''state is the UpdateState of the editor when the update was made'''
         pass
 
     def broadcast(self, editor):
         pass
 
+
+class UpdateState(object):
+    '''Editor state an update was made in. Observers updated from another
+    thread see the editor later, so they check this instead.'''
+
+    def __init__(self, command=None, active_frame=None, empty=False):
+        self.command = command # name of the command(s), None for undo/redo
+        self.active_frame = active_frame
+        self.empty = empty # no frames left
+
+
+class PendingUpdate(object):
+    '''Collects observer updates until they are taken as one.
+
+    Levels are or'ed and elements are united, so any number of commands
+    results in a single update with the state of the last one.
+    Safe to fill from several threads.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.level = 0
+        self.elements = {} # id -> element, frames replaced under the same name are kept apart
+        self.state = None
+
+    def add(self, level, elements, state):
+        '''Returns True if nothing was pending before, so the caller can schedule a flush'''
+        with self.lock:
+            empty = not self.level
+            self.level |= level
+            for element in elements:
+                if element:
+                    self.elements[id(element)] = element
+            self.state = state
+            return empty
+
+    def take(self):
+        '''Returns (level, elements, state) of everything added since the last call'''
+        with self.lock:
+            level, elements, state = self.level, list(self.elements.values()), self.state
+            self.level = 0
+            self.elements = {}
+            self.state = None
+        return level, elements, state
+
+
+class UpdateCoalescer(QObject):
+    '''Applies observer updates of any thread in the Qt thread, merged.
+
+    add() may be called from any thread. The first update after a flush
+    starts a single-shot timer, once it fires flush(level, elements, state)
+    gets everything added meanwhile. Widgets are so refreshed at most rate
+    times per second, however many commands come in.
+    '''
+
+    signal_pending = Signal()
+
+    def __init__(self, flush, rate=50.0, parent=None):
+        super(UpdateCoalescer, self).__init__(parent)
+        self.flush = flush
+        self.pending = PendingUpdate()
+
+        ## Create in the Qt thread, the timer is started there by the signal
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(int(1000.0 / rate))
+        self.timer.timeout.connect(self.take)
+        self.signal_pending.connect(self.timer.start)
+
+    def add(self, level, elements, state):
+        if self.pending.add(level, elements, state):
+            self.signal_pending.emit()
+
+    @Slot()
+    def take(self):
+        level, elements, state = self.pending.take()
+        if level:
+            self.flush(level, elements, state)
+
 # eof
@@ -7,18 +7,27 @@ from python_qt_binding.QtGui import QColor
 
 from frame_editor.commands import *
 
-from frame_editor.interface import Interface
+from frame_editor.interface import Interface, UpdateCoalescer
+from frame_editor import utils_rospkg
 import rospkg
 import os
 
 class FrameEditor_StyleWidget(Interface):
 
+    ## Upper limit for refreshing the widgets, commands in between are merged
+    update_rate = 50.0
+
+    ## Updates only pass through the coalescer to the Qt thread
+    synchronous = True
+
     def __init__(self, frame_editor):
         self.editor = frame_editor
-        self.editor.observers.append(self)
 
         self.old_frame = None
 
+        ## Updates of any thread are collected and applied by a timer
+        self.update_coalescer = UpdateCoalescer(self.flush_update, self.update_rate)
+
         self.layout = QtWidgets.QGridLayout()
         self.widget = QWidget()
         self.widget.setLayout(self.layout)
@@ -66,22 +75,28 @@ class FrameEditor_StyleWidget(Interface):
         print("init")
         self.update_widget(None)
 
+        self.editor.observers.append(self)
+
     def get_widget(self):
         return self.widget
 
-    def update(self, editor, level, elements):
-        
+    def update(self, editor, level, elements, state):
+        self.update_coalescer.add(level, elements, state)
+
+    def flush_update(self, level, elements, state):
+        frame = state.active_frame
+
         if level & 2:
             ## Check for change
-            if self.editor.active_frame is not self.old_frame:
-                self.update_widget(self.editor.active_frame)
-                self.update_values(self.editor.active_frame)
-            self.update_color_label(self.editor.active_frame)
+            if frame is not self.old_frame:
+                self.update_widget(frame)
+                self.update_values(frame)
+            self.update_color_label(frame)
 
         elif level & 4:
-            if self.editor.active_frame is not None:
-                self.update_values(self.editor.active_frame)
-            self.update_color_label(self.editor.active_frame)
+            if frame is not None:
+                self.update_values(frame)
+            self.update_color_label(frame)
     
     def update_widget(self, frame):
         ## Clear layout
@@ -174,7 +189,7 @@ class FrameEditor_StyleWidget(Interface):
                 self.editor.command(Command_SetGeometry(self.editor, self.editor.active_frame, "package", ""))
                 self.editor.command(Command_SetGeometry(self.editor, self.editor.active_frame, "path", path))
             else:
-                rel_path = os.path.relpath(path , rospkg.RosPack().get_path(rospackage))
+                rel_path = os.path.relpath(path , utils_rospkg.get_path(rospackage))
                 print("Saving: package: {} + relative path: {}".format(rospackage, rel_path))
                 self.editor.command(Command_SetGeometry(self.editor, self.editor.active_frame, "package", rospackage))
                 self.editor.command(Command_SetGeometry(self.editor, self.editor.active_frame, "path", rel_path))
@@ -28,18 +28,20 @@ class FrameEditor_InteractiveMarker(Interface):
         self.old_frame = None
 
 
-    def update(self, editor, level, elements):
+    def update(self, editor, level, elements, state):
+        ## Runs in its own thread, the active frame may have changed meanwhile
+        frame = state.active_frame
 
         if level & 2:
             ## Check for change
-            if self.editor.active_frame is not self.old_frame:
-                self.make_interactive(self.editor.active_frame)
+            if frame is not self.old_frame:
+                self.make_interactive(frame)
 
         if level & 4:
-            if self.editor.active_frame is not None:
-                self.int_marker.name = self.editor.active_frame.name
-                self.int_marker.header.frame_id = self.editor.active_frame.parent
-                self.int_marker.pose = self.editor.active_frame.pose
+            if frame is not None:
+                self.int_marker.name = frame.name
+                self.int_marker.header.frame_id = frame.parent
+                self.int_marker.pose = frame.pose
                 self.server.insert(self.int_marker, self.callback_marker)
                 self.server.applyChanges()
 
@@ -1,11 +1,26 @@
 #!/usr/bin/env python
 
-import copy
+import struct
+from io import BytesIO
+
 import rospy
 
 from frame_editor.interface import Interface
 
-from visualization_msgs.msg import Marker
+from visualization_msgs.msg import Marker, MarkerArray
+
+
+class SerializedMarkerArray(MarkerArray):
+    '''MarkerArray which is written from already serialized markers'''
+
+    def __init__(self, serialized_markers):
+        super(SerializedMarkerArray, self).__init__()
+        self.serialized_markers = serialized_markers
+
+    def serialize(self, buff):
+        buff.write(struct.pack('<I', len(self.serialized_markers)))
+        for data in self.serialized_markers:
+            buff.write(data)
 
 
 class FrameEditor_Markers(Interface):
@@ -14,52 +29,77 @@ class FrameEditor_Markers(Interface):
         self.editor = frame_editor
         self.editor.observers.append(self)
 
-        self.publisher = rospy.Publisher("frame_editor_marker", Marker, queue_size=10, latch=False)
-        self.last_publish_time = rospy.Time.now()
-        self.publish_period = rospy.Duration(2.0)
+        self.namespace = "frame_editor_markers"
+        self.publisher = rospy.Publisher("frame_editor_marker_array", MarkerArray, queue_size=10, latch=False)
+        self.publish_period = 2.0
 
+        self.editor.scheduler.add_job(
+            lambda: self.broadcast(self.editor), lambda: self.publish_period)
 
-    def update(self, editor, level, elements):
 
-        ## Publish all changed markers
+    def update(self, editor, level, elements, state):
 
-        for element in elements:
-            if not element:
-                continue
-            if element.marker:
-                self.publish_marker(element)
+        ## Publish all changed markers in a single message
+        markers = []
 
+        if level & 1 and state.empty:
+            ## Everything has been removed
+            markers.append(self.delete_all_marker())
+        else:
+            for element in elements:
+                if not element:
+                    continue
+                if element.has_marker:
+                    markers.append(self.serialized_marker(element))
 
-    def publish_marker(self, element):
+        if markers:
+            self.publisher.publish(SerializedMarkerArray(markers))
 
-        element.update_marker() ## ToDo
 
-        marker = copy.deepcopy(element.marker) # copy
+    def serialized_marker(self, element):
 
-        marker.header.frame_id = element.name
-        marker.header.stamp = rospy.Time() # zero time
-        marker.ns = "frame_editor_markers"
-        marker.frame_locked = True # Tells rviz to retransform the marker into the current location of the specified frame every update cycle.
+        if element.hidden or (element.style == "mesh" and not element.path):
+            return self.serialize(self.delete_marker(element))
 
-        if element.hidden:
-            marker.action = Marker.DELETE
-        else:
+        ## The serialized marker is cached in the element until
+        ## one of its geometry, color or style changes (update_marker)
+        if element.marker_data is None:
+            marker = element.marker # built on demand, not kept in the element
+
+            marker.header.stamp = rospy.Time() # zero time
+            marker.ns = self.namespace
+            marker.frame_locked = True # Tells rviz to retransform the marker into the current location of the specified frame every update cycle.
             marker.action = Marker.ADD
 
-        if element.style == "mesh":
-            if element.path == "" or element.path is None:
-                marker.action = Marker.DELETE
+            element.marker_data = self.serialize(marker)
 
-        self.publisher.publish(marker)
+        return element.marker_data
 
 
-    def broadcast(self, editor):
-        ## Publish with own rate
-        if (rospy.Time.now() - self.last_publish_time) >= self.publish_period:
+    def delete_marker(self, element):
+        marker = Marker()
+        marker.ns = self.namespace
+        marker.id = element.marker_id
+        marker.action = Marker.DELETE
+        return marker
+
+
+    def delete_all_marker(self):
+        marker = Marker()
+        marker.ns = self.namespace
+        marker.action = Marker.DELETEALL
+        return self.serialize(marker)
 
-            ## Update all markers
-            self.update(editor, 0, editor.frames.values())
 
-            self.last_publish_time = rospy.Time.now()
+    @staticmethod
+    def serialize(marker):
+        buff = BytesIO()
+        marker.serialize(buff)
+        return buff.getvalue()
+
+
+    def broadcast(self, editor):
+        ## Update all markers, called with own rate by the scheduler
+        self.update(editor, 0, list(editor.frames.values()), editor.update_state())
 
 # eof
@@ -27,6 +27,9 @@ class FrameEditor_Services(Interface):
         rospy.Service("~get_frame", GetFrame, self.callback_get_frame)
         rospy.Service("~remove_frame", RemoveFrame, self.callback_remove_frame)
         rospy.Service("~set_frame", SetFrame, self.callback_set_frame)
+        rospy.Service("~get_frames", GetFrames, self.callback_get_frames)
+        rospy.Service("~remove_frames", RemoveFrames, self.callback_remove_frames)
+        rospy.Service("~set_frames", SetFrames, self.callback_set_frames)
         rospy.Service("~set_parent", SetParentFrame, self.callback_set_parent_frame)
         rospy.Service("~copy_frame", CopyFrame, self.callback_copy_frame)
 
@@ -162,6 +165,111 @@ class FrameEditor_Services(Interface):
         return response
 
 
+    def callback_get_frames(self, request):
+        print("> Request to get {} frames".format(len(request.name)))
+
+        response = GetFramesResponse()
+        response.error_code = 0
+
+        ## No names: all frames
+        names = request.name
+        if not names:
+            names = sorted(f.name for f in self.editor.iter_frames(include_temp=False))
+
+        for name in names:
+            f = self.editor.frames.get(name)
+            if f is None:
+                error_code = 1 if name == "" else 2
+                response.error_codes.append(error_code)
+                response.error_code = response.error_code or error_code
+                response.name.append(name)
+                response.parent.append("")
+                response.pose.append(Pose())
+            else:
+                response.error_codes.append(0)
+                response.name.append(f.name)
+                response.parent.append(f.parent)
+                response.pose.append(ToPose(f.position, f.orientation))
+
+        return response
+
+
+    def callback_remove_frames(self, request):
+        print("> Request to remove {} frames".format(len(request.name)))
+
+        response = RemoveFramesResponse()
+        response.error_code = 0
+
+        for name in request.name:
+            if name == "":
+                error_code = 1
+            elif name not in self.editor.frames:
+                error_code = 2
+            else:
+                error_code = 0
+            response.error_codes.append(error_code)
+            response.error_code = response.error_code or error_code
+
+        ## All or nothing
+        if response.error_code != 0:
+            print(" Error: Invalid frames, nothing removed")
+            return response
+        if not request.name:
+            return response
+
+        commands = [Command_RemoveElement(self.editor, self.editor.frames[name])
+                    for name in set(request.name)]
+        self.editor.command_macro("Remove frames", commands)
+
+        return response
+
+
+    def callback_set_frames(self, request):
+        print("> Request to set (or add) {} frames".format(len(request.name)))
+
+        response = SetFramesResponse()
+        response.error_code = 0
+
+        if len(request.pose) != len(request.name) or \
+                (request.parent and len(request.parent) != len(request.name)):
+            print(" Error: name, parent and pose have different lengths")
+            response.error_code = 3
+            return response
+
+        parents = request.parent or [""] * len(request.name)
+
+        frames = {} # the last entry of a name wins
+        for name, parent, pose in zip(request.name, parents, request.pose):
+            error_code = 0
+            if name == "":
+                error_code = 1
+            elif parent == "":
+                if name in self.editor.frames:
+                    parent = self.editor.frames[name].parent
+                else:
+                    error_code = 2
+            response.error_codes.append(error_code)
+            response.error_code = response.error_code or error_code
+
+            if error_code == 0:
+                frames[name] = Frame(name,
+                                     FromPoint(pose.position),
+                                     FromQuaternion(pose.orientation),
+                                     parent)
+
+        ## All or nothing
+        if response.error_code != 0:
+            print(" Error: Invalid frames, nothing set")
+            return response
+        if not frames:
+            return response
+
+        commands = [Command_AddElement(self.editor, f) for f in frames.values()]
+        self.editor.command_macro("Set frames", commands)
+
+        return response
+
+
     def callback_set_parent_frame(self, request):
         print("> Request to set parent_frame {} {}".format(request.name, request.parent))
 
@@ -176,6 +284,10 @@ class FrameEditor_Services(Interface):
             print(" Error: No parent_name given")
             response.error_code = 2
 
+        elif self.editor.frames.creates_cycle(request.name, request.parent):
+            print(" Error: {} is a descendant of {}".format(request.parent, request.name))
+            response.error_code = 3
+
         else:
             f = self.editor.frames[request.name]
             self.editor.command(Command_SetParent(self.editor, f, request.parent, request.keep_absolute))
@@ -241,6 +353,7 @@ class FrameEditor_Services(Interface):
                             response.error_code = 3
                             return response
 
+                    self.editor.interface_tf.request_broadcast([request.source_name, request.parent])
                     Frame.wait_for_transform(request.source_name, request.parent, rospy.Duration(1.0))
                     self.editor.command(Command_CopyElement(self.editor, request.name, request.source_name, request.parent))
                     Frame.wait_for_transform(request.parent, request.name, rospy.Duration(1.0))
@@ -249,6 +362,7 @@ class FrameEditor_Services(Interface):
                 else:
                     frame = self.editor.frames[request.name]
 
+                    self.editor.interface_tf.request_broadcast([request.source_name, request.parent])
                     Frame.wait_for_transform(request.source_name, request.parent, rospy.Duration(1.0))
                     if (request.parent != "") and (frame.parent != request.parent):
                         print(">> rebase")
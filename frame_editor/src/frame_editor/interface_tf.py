@@ -1,25 +1,110 @@
 #!/usr/bin/env python
 
+import threading
+import time
+
 import rospy
 
-from frame_editor.constructors_geometry import ToTransformStamped
 from frame_editor.interface import Interface
 from frame_editor.objects import Frame
 
 
 class FrameEditor_TF(Interface):
 
+    ## Only marks frames as dirty, broadcasting is done by the scheduler
+    synchronous = True
+
     def __init__(self, frame_editor):
         self.editor = frame_editor
         self.editor.observers.append(self)
 
+        ## Dirty set ##
+        ## Frames touched by a command are sent on every tick until they have
+        ## not been changed for edit_timeout seconds. All other frames are
+        ## refreshed every editor.keep_alive seconds (or latched on /tf_static).
+        self.edit_timeout = 1.0
+        self.dirty = {} # name -> time of last change
+        self.static_changed = True
+        self.lock = threading.Lock()
+
+        ## Static mode ##
+        ## tf listeners keep the cache type a frame first arrived with. New
+        ## frames therefore go to /tf_static right away, and only frames sent
+        ## there before are routed through /tf while they are edited.
+        self.sent_static = set()
+
+        ## Fast while frames are being edited, idle otherwise
+        self.editor.scheduler.add_job(
+            lambda: self.broadcast(self.editor),
+            lambda: 1.0 / self.editor.hz,
+            needs_work=self.needs_work)
+        self.editor.scheduler.add_job(
+            lambda: self.broadcast_keep_alive(self.editor),
+            lambda: self.editor.keep_alive,
+            needs_work=lambda: not self.editor.static_tf)
+
+    def update(self, editor, level, elements, state):
+        self.refresh([element.name for element in elements if element])
+        if level & 1:
+            ## Frames were added or removed
+            with self.lock:
+                self.static_changed = True
+
+    def request_broadcast(self, names):
+        '''Marks names as dirty and wakes the scheduler to send them right away'''
+        self.refresh(names)
+        self.editor.scheduler.wake()
+
+    def needs_work(self):
+        return bool(self.dirty) or self.static_changed
+
+    def refresh(self, names):
+        '''Marks frames and their editor-owned ancestors as dirty,
+        so complete chains are sent on the next ticks'''
+        now = time.time()
+        frames = self.editor.frames
+        with self.lock:
+            for name in names:
+                visited = set()
+                while name in frames and name not in visited:
+                    visited.add(name)
+                    self.dirty[name] = now
+                    name = frames[name].parent
+
     def broadcast(self, editor):
         #print "> Broadcasting"
         now = rospy.Time.now()
-        transforms = [
-            ToTransformStamped(
-                f.position, f.orientation, now, f.name, f.parent)
-            for f in editor.frames.values()]
-        Frame.tf_broadcaster.sendTransform(transforms)
+
+        ## Frames which have not been changed for a while are clean again
+        with self.lock:
+            deadline = time.time() - self.edit_timeout
+            for name, stamp in list(self.dirty.items()):
+                if stamp < deadline:
+                    del self.dirty[name]
+                    self.static_changed = True
+            dirty = set(self.dirty)
+            static_changed = self.static_changed
+            self.static_changed = False
+
+        frames = list(editor.frames.values())
+
+        if editor.static_tf:
+            new = set(f.name for f in frames) - self.sent_static
+            if static_changed:
+                ## The latched message always has to contain the complete static set,
+                ## frames being edited are updated through /tf meanwhile
+                Frame.tf_static_broadcaster.sendTransform([f.transform(now) for f in frames])
+                self.sent_static.update(new)
+            dirty -= new
+
+        transforms = [f.transform(now) for f in frames if f.name in dirty]
+        if transforms:
+            Frame.tf_broadcaster.sendTransform(transforms)
+
+    def broadcast_keep_alive(self, editor):
+        now = rospy.Time.now()
+        transforms = [f.transform(now) for f in editor.frames.values()]
+        if transforms:
+            Frame.tf_broadcaster.sendTransform(transforms)
 
 # eof
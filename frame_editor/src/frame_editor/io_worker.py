@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+import threading
+import traceback
+from collections import deque
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+
+class IOJob(object):
+
+    def __init__(self, worker, name, function, on_success=None):
+        self.worker = worker
+        self.name = name
+        self.function = function
+        self.on_success = on_success
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.finished = False
+
+    def wait(self, timeout=None):
+        '''Blocks until the job is done and finished, returns its result or raises its error'''
+        if not self.done.wait(timeout):
+            raise RuntimeError('{} timed out.'.format(self.name))
+        self.finish()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def finish(self):
+        self.worker.finish(self)
+
+
+class IOWorker(object):
+    '''Runs file jobs one after another in a background thread.
+
+    Jobs work on snapshots taken by the caller, so editing and
+    broadcasting go on while a file is read or written.
+    on_done(job) is called from the worker thread after every job, then
+    job.finish() applies the result of a successful job by calling its
+    on_success(result), in the thread owning the editor state.
+    '''
+
+    def __init__(self, on_done=None):
+        self.on_done = on_done
+        self.queue = Queue()
+
+        self.finish_lock = threading.Lock()
+        self.unfinished = deque() # done jobs, in the order they were submitted
+
+        self.thread = threading.Thread(target=self.run, name='frame_editor_io')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, name, function, on_success=None):
+        job = IOJob(self, name, function, on_success)
+        self.queue.put(job)
+        return job
+
+    def finish(self, job):
+        '''Finishes the done jobs up to job, so waiting for a job never
+        lets it overtake an earlier one, e.g. a queued new file'''
+        with self.finish_lock:
+            while not job.finished and self.unfinished:
+                done = self.unfinished.popleft()
+                done.finished = True
+                if done.error is None and done.on_success is not None:
+                    done.on_success(done.result)
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                job.result = job.function()
+            except Exception as e:
+                print("> {} failed: {}".format(job.name, e))
+                traceback.print_exc()
+                job.error = e
+            with self.finish_lock:
+                self.unfinished.append(job)
+            job.done.set()
+
+            if self.on_done is not None:
+                self.on_done(job)
+
+# eof
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+import json
+import os
+import threading
+
+from frame_editor.commands import Command_ClearAll
+from frame_editor.interface import Interface
+from frame_editor.utils_file import replace_file
+
+
+class Journal(Interface):
+    '''Append-only log of all changes since the last save, to recover from crashes.
+
+    The first line names the last saved file ("base") or holds a complete
+    "snapshot" of the frames, "seq" is the last line contained in it.
+    Every following line records one command with
+    the old and new state of each frame it changed (None if not present):
+        {"seq": 7, "command": "Command_SetPose", "frames": {"a": {"old": .., "new": ..}}}
+
+    Lines are written and fsync'ed in batches by the scheduler. Saving drops
+    the lines the saved file contains, and once more than compact_threshold
+    lines have been written, the journal is rewritten as a single snapshot.
+    '''
+
+    ## Lines have to be written in command order, with the command's name
+    synchronous = True
+
+    def __init__(self, frame_editor, path, flush_period=0.5, compact_threshold=1000):
+        self.editor = frame_editor
+        self.path = path
+        self.flush_period = flush_period
+        self.compact_threshold = compact_threshold
+
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+
+        self.seq = 0
+        self.header = None
+        self.entries = [] # (seq, line) written since the header
+        self.pending = [] # lines not yet written
+        self.states = {} # name -> last journaled frame data
+
+        self.editor.scheduler.add_job(
+            self.flush, lambda: self.flush_period, needs_work=lambda: bool(self.pending))
+
+    ## Recovery ##
+    ##
+    def read(self):
+        '''Returns (header, entries) of the journal file or (None, [])'''
+        if not os.path.exists(self.path):
+            return None, []
+        records = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break # torn last line from a crash
+        if not records:
+            return None, []
+        return records[0], records[1:]
+
+    def recover(self):
+        '''Replays the journal on top of its last saved file.
+        Returns True if frames have been recovered.'''
+        header, entries = self.read()
+        if header is None:
+            return False
+
+        ## Lines may be repeated or older than the header after a crash during a rewrite
+        entries = dict((e["seq"], e) for e in entries if e["seq"] > header["seq"])
+        entries = [entries[seq] for seq in sorted(entries)]
+
+        if "snapshot" in header:
+            frames = header["snapshot"]
+            base = header.get("base", "")
+        else:
+            base = header["base"]
+            current = self.editor.get_full_file_path()
+            if current and current != base:
+                print("> Journal {} belongs to {}, not replayed".format(self.path, base))
+                os.rename(self.path, self.path + ".old")
+                return False
+            if base and not current:
+                self.editor.load_file(base)
+            frames = self.editor.to_data(self.editor.iter_frames(include_temp=False))["frames"]
+
+        if not entries and "snapshot" not in header:
+            return False
+
+        for entry in entries:
+            for name, change in entry["frames"].items():
+                if change["new"] is None:
+                    frames.pop(name, None)
+                else:
+                    frames[name] = change["new"]
+
+        print("> Recovering {} changes from journal {}".format(len(entries), self.path))
+        self.editor.command(Command_ClearAll(self.editor))
+        self.editor.load_data({"frames": frames})
+        self.editor.full_file_path = base or None
+        return True
+
+    def start(self, snapshot=False):
+        '''Starts a new journal for the current frames, registers as observer'''
+        self.reset(self.editor.get_full_file_path(), snapshot)
+        self.editor.observers.append(self)
+
+    ## Observer ##
+    ##
+    def update(self, editor, level, elements, state):
+        if not elements:
+            return
+
+        names = set(element.name for element in elements
+                    if element and not editor.frame_is_temporary(element.name))
+        frames = {}
+        with self.lock:
+            for name in names:
+                frame = editor.frames.get(name)
+                new = None if frame is None else editor.frame_data(frame)
+                old = self.states.get(name)
+                if new == old:
+                    continue
+                if new is None:
+                    del self.states[name]
+                else:
+                    self.states[name] = new
+                frames[name] = {"old": old, "new": new}
+
+            if not frames:
+                return
+            self.seq += 1
+            line = json.dumps({"seq": self.seq, "command": state.command or "undo/redo",
+                               "frames": frames}, separators=(',', ':'))
+            self.entries.append((self.seq, line))
+            self.pending.append(line)
+
+    ## File ##
+    ##
+    def flush(self):
+        '''Appends pending lines and syncs them to disk, compacts if needed'''
+        with self.lock:
+            lines, self.pending = self.pending, []
+            compact = len(self.entries) > self.compact_threshold
+        if not lines:
+            return
+
+        with self.file_lock:
+            with open(self.path, 'a') as f:
+                f.write("".join(line + "\n" for line in lines))
+                f.flush()
+                os.fsync(f.fileno())
+
+        if compact:
+            self.compact()
+
+    def rewrite(self, header, entries):
+        with self.file_lock:
+            replace_file(self.path, lambda f: f.write(
+                json.dumps(header, separators=(',', ':')) + "\n" +
+                "".join(line + "\n" for seq, line in entries)), 'w')
+
+    def reset(self, base, snapshot=False):
+        '''Restarts the journal after the frames have been loaded from base'''
+        with self.lock:
+            self.states = self.editor.to_data(self.editor.iter_frames(include_temp=False))["frames"]
+            self.header = {"base": base, "seq": self.seq}
+            if snapshot:
+                self.header["snapshot"] = dict(self.states)
+            self.entries = []
+            self.pending = []
+            self.rewrite(self.header, [])
+
+    def compact(self):
+        '''Rewrites the journal as a snapshot of the journaled state'''
+        with self.lock:
+            self.header = {"base": self.header["base"], "seq": self.seq, "snapshot": dict(self.states)}
+            self.entries = []
+            self.pending = []
+            self.rewrite(self.header, [])
+
+    def saved(self, base, seq):
+        '''Drops the lines up to seq, which are contained in the saved file base'''
+        with self.lock:
+            if seq < self.header["seq"]:
+                return # a newer snapshot already contains it
+            self.header = {"base": base, "seq": seq}
+            self.entries = [(s, line) for s, line in self.entries if s > seq]
+            self.pending = []
+            self.rewrite(self.header, self.entries)
+
+# eof
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import copy
 import time
 
 import rospy
@@ -11,23 +12,39 @@ import tf2_ros
 from frame_editor.constructors_geometry import *
 from frame_editor.constructors_std import *
 from frame_editor.srv import *
-from frame_editor import utils_tf
+from frame_editor import utils_rospkg, utils_tf
+from frame_editor.pose_table import poses
+from frame_editor.tf_inventory import TfInventory
 
 from geometry_msgs.msg import Pose
 
 from visualization_msgs.msg import InteractiveMarkerControl, Marker
-import rospkg
 
 
 class Frame(object):
 
+    ## Slots instead of a __dict__ per instance keep large scenes small,
+    ## position and orientation are kept in row _row of the pose table
+    __slots__ = ('_name', '_row', '_parent', '_transform', '_generation',
+                 'style', 'color', 'hidden')
+
+    ## Plain frames have no marker, geometry objects build it on demand
+    has_marker = False
+    marker = None
+
     tf_broadcaster = None
+    tf_static_broadcaster = None
     tf_buffer = None
     tf_listener = None
+    tf_inventory = None
+    tf_cache_time = 10.0 # seconds, also after which the inventory forgets frames
 
     __id_counter = -1
 
     def __init__(self, name, position=(0,0,0), orientation=(0,0,0,1), parent="world", style="none"):
+        self._row = poses.allocate()
+        self._transform = None
+        self._generation = 0
         self.name = name
         self.position = position
         self.orientation = orientation
@@ -36,24 +53,107 @@ class Frame(object):
         self.color = (0.0, 0.5, 0.5, 0.75)
 
         self.hidden = False
-        self.marker = None
+
+    def __del__(self):
+        row = getattr(self, '_row', None)
+        if row is not None and poses is not None: # module globals are gone at exit
+            poses.release(row)
+
+    def __copy__(self):
+        return self.copy_slots(lambda value: value)
+
+    def __deepcopy__(self, memo):
+        return self.copy_slots(lambda value: copy.deepcopy(value, memo))
+
+    def copy_slots(self, copy_value):
+        '''Returns a copy of this frame with a row of its own'''
+        other = type(self).__new__(type(self))
+        other._row = poses.allocate()
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if slot not in ('_row', '_transform') and hasattr(self, slot):
+                    setattr(other, slot, copy_value(getattr(self, slot)))
+        other.position = self.position
+        other.orientation = self.orientation
+        return other
 
     @staticmethod
     def init_tf():
         if Frame.tf_buffer is None:
             Frame.tf_broadcaster = tf2_ros.TransformBroadcaster()
-            Frame.tf_buffer = tf2_ros.Buffer()
-            Frame.tf_listener = tf2_ros.TransformListener(Frame.tf_buffer)
+            Frame.tf_static_broadcaster = tf2_ros.StaticTransformBroadcaster()
+            Frame.tf_buffer = tf2_ros.Buffer(rospy.Duration(Frame.tf_cache_time))
+            Frame.tf_inventory = TfInventory(Frame.tf_cache_time)
+            Frame.tf_listener = utils_tf.TransformListener(Frame.tf_buffer, Frame.tf_inventory)
 
     @classmethod
     def create_new_id(cls):
         cls.__id_counter = cls.__id_counter + 1
         return cls.__id_counter
 
+    ## Properties which are part of the transform invalidate the cached message
+    def invalidate(self):
+        self._generation += 1
+        self._transform = None
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        self._name = value
+        self.invalidate()
+
+    @property
+    def position(self):
+        return poses.translation(self._row)
+
+    @position.setter
+    def position(self, value):
+        poses.set_translation(self._row, value)
+        self.invalidate()
+
+    @property
+    def orientation(self):
+        return poses.rotation(self._row)
+
+    @orientation.setter
+    def orientation(self, value):
+        poses.set_rotation(self._row, value)
+        self.invalidate()
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, value):
+        self._parent = value
+        self.invalidate()
+
     @property
     def pose(self):
         return ToPose(self.position, self.orientation)
 
+    def transform(self, stamp):
+        '''Returns the cached TransformStamped of this frame, only the stamp is rewritten.
+        Setters may run in another thread while the message is built. A message
+        is only kept if no setter ran meanwhile, a setter which ran while it was
+        stored is caught by checking the generation again.'''
+        transform = self._transform
+        if transform is None:
+            generation = self._generation
+            transform = ToTransformStamped(
+                self.position, self.orientation, stamp, self.name, self.parent)
+            if generation == self._generation:
+                self._transform = transform
+                if generation != self._generation and self._transform is transform:
+                    self._transform = None
+        else:
+            transform.header.stamp = stamp
+        return transform
+
     def print_all(self):
         print("  {} (parent: {}) {} {}".format(self.name, self.parent, self.position, self.orientation))
 
@@ -101,37 +201,57 @@ class Frame(object):
     @staticmethod
     def wait_for_transform(target_frame, source_frame, timeout):
         return utils_tf.wait_for_transform(
-            Frame.tf_buffer, target_frame, source_frame, timeout)
+            Frame.tf_buffer, target_frame, source_frame, timeout, Frame.tf_listener)
 
 
 class Object_Geometry(Frame):
 
+    __slots__ = ('marker_id', 'marker_data')
+
+    has_marker = True
+
     def __init__(self, name, position, orientation, parent, style):
 
         super(Object_Geometry, self).__init__(name, position, orientation, parent, style)
 
+        self.marker_id = Frame.create_new_id()
+        self.marker_data = None # serialized marker, cached by interface_markers
+
+    ## The marker header holds the name, so renaming invalidates it
+    @Frame.name.setter
+    def name(self, value):
+        Frame.name.fset(self, value)
+        self.marker_data = None
+
+    @property
+    def marker(self):
+        '''Builds a new Marker message, only done when a marker view needs it'''
         ## TODO: put this into interface_marker.py
-        self.marker = Marker()
-        self.marker.scale = NewVector3(1, 1, 1)
-        self.marker.pose = Pose()
-        self.marker.color = NewColor(self.color[0], self.color[1], self.color[2], self.color[3])
-        self.marker.id = Frame.create_new_id()
-        #self.marker.lifetime = 0 # forever
-        self.update_marker()
+        marker = Marker()
+        marker.header.frame_id = self.name
+        marker.id = self.marker_id
+        marker.pose = Pose()
+        marker.scale = NewVector3(1, 1, 1)
+        marker.color = NewColor(self.color[0], self.color[1], self.color[2], self.color[3])
+        #marker.lifetime = 0 # forever
+        self.build_marker(marker)
+        return marker
+
+    def build_marker(self, marker):
+        pass
 
     def update_marker(self):
-        self.marker.header.frame_id = self.name
-        self.marker.header.stamp = rospy.Time.now()
+        self.marker_data = None # invalidate serialized marker
 
     def set_color(self, color):
         self.color = color
-        self.marker.color = NewColor(color[0], color[1], color[2], color[3])
         self.update_marker()
-        #self.marker.update()
 
 
 class Object_Plane(Object_Geometry):
 
+    __slots__ = ('length', 'width')
+
     def __init__(self, name, position, orientation, parent, length=1.0, width=1.0):
 
         self.length = length
@@ -139,14 +259,12 @@ class Object_Plane(Object_Geometry):
 
         super(Object_Plane, self).__init__(name, position, orientation, parent, "plane")
 
-    def update_marker(self):
-        super(Object_Plane, self).update_marker()
-
+    def build_marker(self, marker):
         l = self.length*0.5
         w = self.width*0.5
 
-        self.marker.type = Marker.TRIANGLE_LIST
-        self.marker.points = [
+        marker.type = Marker.TRIANGLE_LIST
+        marker.points = [
             NewPoint(-l, -w, 0.0), NewPoint(l, -w, 0.0), NewPoint(-l, w, 0.0),
             NewPoint( l, -w, 0.0), NewPoint(l,  w, 0.0), NewPoint(-l, w, 0.0)
         ]
@@ -154,6 +272,8 @@ class Object_Plane(Object_Geometry):
 
 class Object_Cube(Object_Geometry):
 
+    __slots__ = ('length', 'width', 'height')
+
     def __init__(self, name, position, orientation, parent, length=1.0, width=1.0, height=1.0):
 
         self.length = length
@@ -162,30 +282,30 @@ class Object_Cube(Object_Geometry):
 
         super(Object_Cube, self).__init__(name, position, orientation, parent, "cube")
 
-    def update_marker(self):
-        super(Object_Cube, self).update_marker()
-
-        self.marker.type = Marker.CUBE
-        self.marker.scale = NewVector3(self.length, self.width, self.height)
+    def build_marker(self, marker):
+        marker.type = Marker.CUBE
+        marker.scale = NewVector3(self.length, self.width, self.height)
 
 
 class Object_Sphere(Object_Geometry):
 
+    __slots__ = ('diameter',)
+
     def __init__(self, name, position, orientation, parent, diameter=1.0):
 
         self.diameter = diameter
 
         super(Object_Sphere, self).__init__(name, position, orientation, parent, "sphere")
 
-    def update_marker(self):
-        super(Object_Sphere, self).update_marker()
-
-        self.marker.type = Marker.SPHERE
-        self.marker.scale = NewVector3(self.diameter, self.diameter, self.diameter)
+    def build_marker(self, marker):
+        marker.type = Marker.SPHERE
+        marker.scale = NewVector3(self.diameter, self.diameter, self.diameter)
 
 
 class Object_Axis(Object_Geometry):
 
+    __slots__ = ('length', 'width')
+
     def __init__(self, name, position, orientation, parent, length=1.0, width=0.05):
 
         self.length = length
@@ -193,15 +313,15 @@ class Object_Axis(Object_Geometry):
 
         super(Object_Axis, self).__init__(name, position, orientation, parent, "axis")
 
-    def update_marker(self):
-        super(Object_Axis, self).update_marker()
-
-        self.marker.type = Marker.ARROW
-        self.marker.scale = NewVector3(self.length, self.width, self.width)
+    def build_marker(self, marker):
+        marker.type = Marker.ARROW
+        marker.scale = NewVector3(self.length, self.width, self.width)
 
 
 class Object_Mesh(Object_Geometry):
 
+    __slots__ = ('scale', 'path', 'package')
+
     def __init__(self, name, position, orientation, parent, package=None, mesh_path="", scale=1.0):
 
         self.scale = scale
@@ -210,15 +330,13 @@ class Object_Mesh(Object_Geometry):
 
         super(Object_Mesh, self).__init__(name, position, orientation, parent, "mesh")
 
-    def update_marker(self):
-        super(Object_Mesh, self).update_marker()
-
-        self.marker.type = Marker.MESH_RESOURCE
+    def build_marker(self, marker):
+        marker.type = Marker.MESH_RESOURCE
         if self.package == "" or self.package is None:
-            self.marker.mesh_resource = "file:"+self.path
+            marker.mesh_resource = "file:"+self.path
         else:
-            self.marker.mesh_resource = "file:"+rospkg.RosPack().get_path(self.package)+"/"+self.path
+            marker.mesh_resource = "file:"+utils_rospkg.get_path(self.package)+"/"+self.path
 
-        self.marker.scale = NewVector3(self.scale, self.scale, self.scale)
+        marker.scale = NewVector3(self.scale, self.scale, self.scale)
 
 # eof
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+import threading
+
+import numpy
+
+
+class PoseTable(object):
+    '''Columnar storage of the poses of all frames.
+
+    Every Frame owns a row, translations[row] is its position (x, y, z) and
+    rotations[row] its orientation (x, y, z, w). Bulk operations index the
+    columns with the rows of many frames at once instead of going through
+    the properties of every frame.
+
+    Rows of deleted frames are reused. Writes and growing the columns hold
+    the lock, so no write is lost while the columns are copied.
+    '''
+
+    def __init__(self, capacity=64):
+        self.lock = threading.RLock() # frames may be released while allocating
+        self.translations = numpy.zeros((capacity, 3))
+        self.rotations = numpy.zeros((capacity, 4))
+        self.size = 0 # rows handed out so far
+        self.free = []
+
+    def allocate(self):
+        with self.lock:
+            if self.free:
+                return self.free.pop()
+            if self.size == len(self.translations):
+                self.translations = numpy.concatenate((self.translations, numpy.zeros_like(self.translations)))
+                self.rotations = numpy.concatenate((self.rotations, numpy.zeros_like(self.rotations)))
+            self.size += 1
+            return self.size - 1
+
+    def release(self, row):
+        with self.lock:
+            self.free.append(row)
+
+    ## Single rows ##
+    ##
+    def translation(self, row):
+        return tuple(self.translations[row].tolist())
+
+    def rotation(self, row):
+        return tuple(self.rotations[row].tolist())
+
+    def set_translation(self, row, value):
+        with self.lock:
+            self.translations[row] = value
+
+    def set_rotation(self, row, value):
+        with self.lock:
+            self.rotations[row] = value
+
+    ## Bulk ##
+    ##
+    def gather(self, rows):
+        '''Returns (translations, rotations) of the rows as N x 3 and N x 4 arrays'''
+        rows = numpy.asarray(rows, dtype=numpy.intp)
+        with self.lock:
+            return self.translations[rows], self.rotations[rows]
+
+
+## The table behind Frame.position and Frame.orientation
+poses = PoseTable()
+
+# eof
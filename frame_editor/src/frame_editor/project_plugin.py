@@ -26,7 +26,7 @@ class ProjectPlugin(Plugin):
 
         ## File
         self.load_file("") # loads empty.xml
-        self.update_current_filename()
+        self.update_file_label()
 
     def create_editor(self):
         raise NotImplementedError
@@ -104,11 +104,9 @@ class ProjectPlugin(Plugin):
         if self.ok_to_continue():
             ## Create new empty app-root
             #self.editor.undo_stack.clear()
+            ## The file name is reset once loading is done
             self.load_file("")
 
-            ## Set file name to undefined
-            self.update_current_filename()
-
     def open(self):
         if self.ok_to_continue():
 
@@ -134,16 +132,13 @@ class ProjectPlugin(Plugin):
 
 
     def load_file(self, file_name):
-        if not self.editor.load_file(file_name):
-            print("ERROR LOADING FILE")
-            return False
-        else:
-            self.update_current_filename()
+        ## Loading runs in the background, the file name is shown once it is done
+        self.editor.load_file_async(file_name)
 
-            if file_name:
-                self.settings.setValue('last_folder', os.path.dirname(file_name))
-                self.settings.sync()
-            return True
+        if file_name:
+            self.settings.setValue('last_folder', os.path.dirname(file_name))
+            self.settings.sync()
+        return True
 
     def ok_to_continue(self):
         """If the file has been modified, the user is asked, whether he wants to save it first or not.
@@ -160,41 +155,42 @@ class ProjectPlugin(Plugin):
                 QtWidgets.QMessageBox.Yes)
 
             if reply == QtWidgets.QMessageBox.Yes:
-                return self.save()
+                ## The edits are dropped next, so only go on once they are written
+                return self.save(wait=True)
             elif reply == QtWidgets.QMessageBox.Cancel:
                 return False
 
         return True
 
-    def save(self):
+    def save(self, wait=False):
         """Calls save_as or save_file
         """
         if self.editor.get_file_name() == "":
-            return self.save_as()
+            return self.save_as(wait)
         else:
-            return self.save_file(self.editor.get_full_file_path())
+            return self.save_file(self.editor.get_full_file_path(), wait)
 
-    def save_as(self):
+    def save_as(self, wait=False):
         #file_path = QtCore.QFileInfo(self.editor.get_file_name()).canonicalPath()
         #file_name, stuff = QtWidgets.QFileDialog.getSaveFileName(None, "Save File", file_path, self.file_type)
         file_name, stuff = QtWidgets.QFileDialog.getSaveFileName(None, "Save File", self.editor.get_full_file_path(), self.file_type)
         if file_name == "":
             return False
         else:
-            if not file_name.endswith(".yaml"):
-                file_name += ".yaml"
-            return self.save_file(file_name)
+            if not file_name.endswith((".yaml", ".fes")):
+                file_name += ".fes" if ".fes" in stuff else ".yaml"
+            return self.save_file(file_name, wait)
 
-    def save_file(self, file_name):
-        if not self.write_file(file_name):
+    def save_file(self, file_name, wait=False):
+        ## Clean state and file name are set once writing is done
+        if not self.write_file(file_name, wait):
             print("Saving canceled")
             return False
         else:
-            self.update_current_filename()
-            print("File saved")
             return True
 
-    def write_file(self, file_name):
+    def write_file(self, file_name, wait=False):
+        '''Returns True once writing is queued, with wait only if it succeeded'''
         raise NotImplementedError
 
     def update_current_filename(self):
@@ -202,6 +198,9 @@ class ProjectPlugin(Plugin):
         self.editor.undo_stack.setClean()
         self.widget.setWindowModified(False)
 
+        self.update_file_label()
+
+    def update_file_label(self):
         file_name = self.editor.get_file_name()
 
         ## Window title
@@ -233,7 +232,8 @@ class ProjectPlugin(Plugin):
                 QtWidgets.QMessageBox.No)
 
             if reply == QtWidgets.QMessageBox.Yes:
-                self.save_as()
+                ## The io thread does not outlive the process
+                self.save_as(wait=True)
         # unregister interfaces
 
 
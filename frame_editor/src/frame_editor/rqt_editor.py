@@ -4,13 +4,12 @@ import os
 import math
 
 import rospy
-import rospkg
 import tf
 import actionlib
 
 from qt_gui_py_common.worker_thread import WorkerThread
 
-from python_qt_binding import loadUi, QtCore, QtWidgets
+from python_qt_binding import loadUi, QtCore, QtGui, QtWidgets
 from python_qt_binding.QtWidgets import QWidget
 from python_qt_binding.QtCore import Slot
 
@@ -18,9 +17,11 @@ from frame_editor.editor import Frame, FrameEditor
 from frame_editor.commands import *
 from frame_editor.constructors_geometry import *
 
+from frame_editor.gui_models import FrameListModel, FrameTreeModel
 from frame_editor.project_plugin import ProjectPlugin
+from frame_editor import utils_rospkg
 
-from frame_editor.interface import Interface
+from frame_editor.interface import Interface, UpdateCoalescer
 
 ## Views
 from frame_editor.interface_gui import FrameEditor_StyleWidget
@@ -28,14 +29,21 @@ from frame_editor.interface_gui import FrameEditor_StyleWidget
 
 class FrameEditorGUI(ProjectPlugin, Interface):
 
-    signal_update = QtCore.Signal(int)
+    ## Upper limit for refreshing the widgets, commands in between are merged
+    update_rate = 50.0
+
+    ## Updates only pass through the coalescer to the Qt thread
+    synchronous = True
+
+    signal_tf_changed = QtCore.Signal()
+    signal_io_finish = QtCore.Signal(object)
 
     def __init__(self, context):
         super(FrameEditorGUI, self).__init__(context)
 
         self.setObjectName('FrameEditorGUI')
 
-        self.file_type = "YAML files(*.yaml)"
+        self.file_type = "Frame editor files(*.yaml *.fes);;YAML files(*.yaml);;Binary scene files(*.fes)"
 
         self.editor.parse_args(context.argv())
 
@@ -46,7 +54,8 @@ class FrameEditorGUI(ProjectPlugin, Interface):
         ## Update thread ##
         ##
         self._update_thread.start()
-        self.update_all(3)
+        self.update_all(3, None)
+        self.update_tf_list()
 
 
     def create_editor(self):
@@ -54,12 +63,21 @@ class FrameEditorGUI(ProjectPlugin, Interface):
 
         editor.observers.append(self)
 
-        self.signal_update.connect(self.update_all)
+        ## Updates of any thread are collected and applied by a timer
+        self.update_coalescer = UpdateCoalescer(self.flush_update, self.update_rate, self)
+
+        ## File jobs change the undo stack and file name in the Qt thread
+        self.signal_io_finish.connect(self.finish_io_job)
+        editor.io_finisher = self.signal_io_finish.emit
+
+        ## The tf inventory calls from the ros thread
+        self.signal_tf_changed.connect(self.tf_changed)
+        editor.tf_inventory().add_listener(self.signal_tf_changed.emit)
 
         self._update_thread = WorkerThread(self._update_thread_run, self._update_finished)
 
-        self.old_frame_list = []
         self.old_selected = ""
+        self.updating_list = False # ignore selection changes caused by the model
 
         return editor
 
@@ -68,7 +86,7 @@ class FrameEditorGUI(ProjectPlugin, Interface):
 
         ## Main widget
         widget = QWidget()
-        ui_file = os.path.join(rospkg.RosPack().get_path('frame_editor'), 'src/frame_editor', 'FrameEditorGUI.ui')
+        ui_file = os.path.join(utils_rospkg.get_path('frame_editor'), 'src/frame_editor', 'FrameEditorGUI.ui')
         loadUi(ui_file, widget)
         widget.setObjectName('FrameEditorGUIUi')
 
@@ -92,7 +110,18 @@ class FrameEditorGUI(ProjectPlugin, Interface):
         widget.btn_add.clicked.connect(self.btn_add_clicked)
         widget.btn_delete.clicked.connect(self.btn_delete_clicked)
         widget.btn_duplicate.clicked.connect(self.btn_duplicate_clicked)
-        widget.list_frames.currentTextChanged.connect(self.selected_frame_changed)
+        ## Frame list, sorted by the model and filtered by the proxy
+        self.frame_model = FrameListModel(widget)
+        self.frame_proxy = QtCore.QSortFilterProxyModel(widget)
+        self.frame_proxy.setSourceModel(self.frame_model)
+        self.frame_proxy.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        widget.list_frames.setModel(self.frame_proxy)
+        widget.list_frames.selectionModel().currentChanged.connect(self.current_frame_changed)
+        widget.txt_filter.textChanged.connect(self.filter_changed)
+
+        ## Tf tree, children are only added when a frame is expanded
+        self.tf_model = FrameTreeModel(widget)
+        widget.list_tf.setModel(self.tf_model)
         widget.btn_refresh.clicked.connect(self.update_tf_list)
 
         widget.btn_set_parent_rel.clicked.connect(self.btn_set_parent_rel_clicked)
@@ -134,16 +163,22 @@ class FrameEditorGUI(ProjectPlugin, Interface):
         print("> Shutting down")
 
 
-    def update(self, editor, level, elements):
-        self.signal_update.emit(level)
+    def update(self, editor, level, elements, state):
+        self.update_coalescer.add(level, elements, state)
 
+    def flush_update(self, level, elements, state):
+        self.update_all(level, [element.name for element in elements])
 
-    @Slot(int)
-    def update_all(self, level):
+
+    @Slot(object)
+    def finish_io_job(self, finish):
+        finish()
+
+    @Slot(int, object)
+    def update_all(self, level, names):
         ## Update list widgets
         if level & 1:
-            self.update_frame_list()
-            self.update_tf_list()
+            self.update_frame_list(names)
             self.update_current_filename()
 
         ## Update the currently selected frame
@@ -154,40 +189,77 @@ class FrameEditorGUI(ProjectPlugin, Interface):
         if level & 4:
             self.update_fields()
 
+        ## A file has been loaded or saved
+        if level & 8:
+            self.update_file_label()
+            if self.editor.io_error:
+                QtWidgets.QMessageBox.warning(self.widget, "frame editor", self.editor.io_error)
+                self.editor.io_error = None
+                ## A failed save did not set the stack clean, a failed export changes nothing
+                self.widget.setWindowModified(not self.editor.undo_stack.isClean())
+
 
     @Slot()
     def update_tf_list(self):
-        self.widget.list_tf.clear()
-        self.widget.list_tf.addItems(
-            sorted(self.editor.all_frame_ids(include_temp=False)))
+        '''Compares the whole tree with the tf inventory'''
+        inventory = self.editor.tf_inventory()
+        inventory.take_changes()
+        parents = dict((name, parent) for name, parent in inventory.all_parents().items()
+                       if not self.editor.frame_is_temporary(name))
+        self.tf_model.update_parents(parents)
 
-    def update_frame_list(self):
-        new_list = self.editor.frames.keys()
-
-        ## Add missing
-        items = []
-        for item in new_list:
-            if item not in self.old_frame_list:
-                items.append(item)
-        self.widget.list_frames.addItems(items)
-
-        ## Delete removed
-        for item in self.old_frame_list:
-            if item not in new_list:
-                if self.widget.list_frames.currentItem() and item == self.widget.list_frames.currentItem().text():
-                    self.widget.list_frames.setCurrentItem(None)
-                found = self.widget.list_frames.findItems(item, QtCore.Qt.MatchExactly)
-                self.widget.list_frames.takeItem(self.widget.list_frames.row(found[0]))
-
-        self.widget.list_frames.sortItems()
+    @Slot()
+    def tf_changed(self):
+        '''Applies the frames tf has added or reparented since the last call'''
+        inventory = self.editor.tf_inventory()
+        changed = set(name for name in inventory.take_changes()
+                      if not self.editor.frame_is_temporary(name))
+        if changed:
+            self.tf_model.update_parents(inventory.parents_of(changed), changed)
+
+    def current_tf_name(self):
+        index = self.widget.list_tf.currentIndex()
+        if not index.isValid():
+            return None
+        return index.data()
+
+    def update_frame_list(self, names=None):
+        '''Adds and removes the changed names, rebuilds the list if names is None'''
+        self.updating_list = True
+        if self.current_frame_name() not in self.editor.frames:
+            self.select_frame_item(None)
+        if names is None:
+            self.frame_model.set_names(self.editor.frames.keys())
+        else:
+            self.frame_model.update_names(names, self.editor.frames)
+        self.updating_list = False
 
-        self.old_frame_list = new_list
+    @Slot(str)
+    def filter_changed(self, text):
+        self.updating_list = True
+        self.frame_proxy.setFilterFixedString(text)
+        if self.editor.active_frame:
+            self.select_frame_item(self.editor.active_frame.name)
+        self.updating_list = False
+
+    def current_frame_name(self):
+        index = self.widget.list_frames.currentIndex()
+        if not index.isValid():
+            return None
+        return index.data()
+
+    def select_frame_item(self, name):
+        if name is None:
+            index = QtCore.QModelIndex()
+        else:
+            index = self.frame_proxy.mapFromSource(self.frame_model.index_of(name))
+        self.widget.list_frames.setCurrentIndex(index)
 
 
     def update_active_frame(self):
         if not self.editor.active_frame:
             self.old_selected = ""
-            self.widget.list_frames.setCurrentItem(None)
+            self.select_frame_item(None)
             self.widget.box_edit.setEnabled(False)
             return # deselect and quit
 
@@ -198,8 +270,7 @@ class FrameEditorGUI(ProjectPlugin, Interface):
             return # no change
 
         ## Select item in list
-        items = self.widget.list_frames.findItems(name, QtCore.Qt.MatchExactly)
-        self.widget.list_frames.setCurrentItem(items[0])
+        self.select_frame_item(name)
 
         self.update_fields()
 
@@ -236,8 +307,7 @@ class FrameEditorGUI(ProjectPlugin, Interface):
 
         ## Absolute
         try:
-            position, orientation = FromTransformStamped(
-                f.tf_buffer.lookup_transform('world', f.name, rospy.Time(0)))
+            position, orientation = self.editor.lookup_transform('world', f.name)
             for txt, p in zip(txt_abs_pos, position):
                 txt.setEnabled(True)
                 txt.setValue(p)
@@ -255,6 +325,12 @@ class FrameEditorGUI(ProjectPlugin, Interface):
         self.widget.combo_style.setCurrentIndex(self.widget.combo_style.findText(f.style))
 
 
+    @Slot(QtCore.QModelIndex, QtCore.QModelIndex)
+    def current_frame_changed(self, current, previous):
+        if self.updating_list:
+            return
+        self.selected_frame_changed(current.data() if current.isValid() else "")
+
     @Slot(str)
     def selected_frame_changed(self, name):
         if name == "":
@@ -266,8 +342,41 @@ class FrameEditorGUI(ProjectPlugin, Interface):
 
     ## BUTTONS ##
     ##
-    def write_file(self, file_name):
-        return self.editor.save_file(file_name)
+    def write_file(self, file_name, wait=False):
+        ## Writing runs in the background, errors are reported by update_all
+        job = self.editor.save_file_async(file_name)
+        if not wait:
+            return True
+        try:
+            job.wait()
+        except Exception:
+            return False
+        return True
+
+
+    def create_menus(self):
+        super(FrameEditorGUI, self).create_menus()
+
+        saveSelectionAction = QtWidgets.QAction("Save Se&lection", self)
+        saveSelectionAction.setStatusTip("Save the selected frame and its descendants to another file")
+        saveSelectionAction.setIcon(QtGui.QIcon.fromTheme("document-export"))
+        saveSelectionAction.triggered.connect(self.save_selection)
+        self.widget.mainToolBar.addSeparator()
+        self.widget.mainToolBar.addAction(saveSelectionAction)
+
+    @Slot()
+    def save_selection(self):
+        name = self.current_frame_name()
+        if not name:
+            return
+        file_name, stuff = QtWidgets.QFileDialog.getSaveFileName(self.widget,
+            "Save '{}' and its descendants".format(name), self.settings.value('last_folder', ''), self.file_type)
+        if file_name == "":
+            return
+        if not file_name.endswith((".yaml", ".fes")):
+            file_name += ".fes" if ".fes" in stuff else ".yaml"
+        ## Writing runs in the background, errors are reported by update_all
+        self.editor.export_subtree_async(name, file_name)
 
 
     @Slot()
@@ -277,20 +386,17 @@ class FrameEditorGUI(ProjectPlugin, Interface):
     @Slot(bool)
     def btn_add_clicked(self, checked):
         # Get a unique frame name
-        existing_frames = set(self.editor.all_frame_ids())
-
         name, ok = QtWidgets.QInputDialog.getText(self.widget, "Add New Frame", "Name:", QtWidgets.QLineEdit.Normal, "my_frame");
 
-        while ok and name in existing_frames:
+        while ok and self.editor.frame_id_exists(name):
             name, ok = QtWidgets.QInputDialog.getText(self.widget, "Add New Frame", "Name (must be unique):", QtWidgets.QLineEdit.Normal, "my_frame")
         if not ok:
             return
 
-        if not existing_frames:
+        available_parents = self.editor.all_frame_ids(include_temp=False)
+        if not available_parents:
             available_parents = ["world"]
-        else:
-            available_parents = self.editor.all_frame_ids(include_temp=False)
-        parent, ok = QtWidgets.QInputDialog.getItem(self.widget, "Add New Frame", "Parent Name:", sorted(available_parents))
+        parent, ok = QtWidgets.QInputDialog.getItem(self.widget, "Add New Frame", "Parent Name:", available_parents)
 
 
         if not ok or parent == "":
@@ -302,18 +408,15 @@ class FrameEditorGUI(ProjectPlugin, Interface):
 
     @Slot(bool)
     def btn_duplicate_clicked(self, checked):
-        item = self.widget.list_frames.currentItem()
-        if not item:
+        source_name = self.current_frame_name()
+        if not source_name:
             return
-        source_name = item.text()
         parent_name = self.editor.frames[source_name].parent
 
         # Get a unique frame name
-        existing_frames = set(self.editor.all_frame_ids())
-
         name, ok = QtWidgets.QInputDialog.getText(self.widget, "Duplicate Frame", "Name:", QtWidgets.QLineEdit.Normal, source_name);
 
-        while ok and name in existing_frames:
+        while ok and self.editor.frame_id_exists(name):
             name, ok = QtWidgets.QInputDialog.getText(self.widget, "Duplicate Frame", "Name (must be unique):", QtWidgets.QLineEdit.Normal, source_name)
         if not ok:
             return
@@ -324,10 +427,24 @@ class FrameEditorGUI(ProjectPlugin, Interface):
 
     @Slot(bool)
     def btn_delete_clicked(self, checked):
-        item = self.widget.list_frames.currentItem()
-        if not item:
+        name = self.current_frame_name()
+        if not name:
             return
-        self.editor.command(Command_RemoveElement(self.editor, self.editor.frames[item.text()]))
+        frame = self.editor.frames[name]
+
+        ## Children would be left behind with a missing parent
+        descendants = len(self.editor.frames.subtree(name)) - 1
+        if descendants:
+            reply = QtWidgets.QMessageBox.question(self.widget, "Delete Frame",
+                "'{}' has {} descendant frames.\nDelete them too?".format(name, descendants),
+                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No | QtWidgets.QMessageBox.Cancel)
+            if reply == QtWidgets.QMessageBox.Cancel:
+                return
+            if reply == QtWidgets.QMessageBox.Yes:
+                self.editor.command(Command_RemoveSubtree(self.editor, frame))
+                return
+
+        self.editor.command(Command_RemoveElement(self.editor, frame))
 
 
     ## PARENTING ##
@@ -341,14 +458,14 @@ class FrameEditorGUI(ProjectPlugin, Interface):
         self.set_parent(True)
 
     def set_parent(self, keep_absolute):
-        parent = self.widget.list_tf.currentItem()
+        parent = self.current_tf_name()
         if not parent:
             return # none selected
 
-        if parent.text() == self.editor.active_frame.name:
-            return # you can't be your own parent
+        if self.editor.frames.creates_cycle(self.editor.active_frame.name, parent):
+            return # you can't be your own parent or grandparent
 
-        self.editor.command(Command_SetParent(self.editor, self.editor.active_frame, parent.text(), keep_absolute))
+        self.editor.command(Command_SetParent(self.editor, self.editor.active_frame, parent, keep_absolute))
 
 
     ## SET BUTTONS ##
@@ -385,12 +502,12 @@ class FrameEditorGUI(ProjectPlugin, Interface):
         self.set_pose(["c"])
 
     def set_pose(self, mode):
-        source = self.widget.list_tf.currentItem()
+        source = self.current_tf_name()
         if not source:
             return # none selected
 
         frame = self.editor.active_frame
-        self.editor.command(Command_AlignElement(self.editor, frame, source.text(), mode))
+        self.editor.command(Command_AlignElement(self.editor, frame, source, mode))
 
 
     ## RESET BUTTONS ##
@@ -401,9 +518,8 @@ class FrameEditorGUI(ProjectPlugin, Interface):
 
     @Slot(bool)
     def btn_reset_position_abs_clicked(self, checked):
-        position, orientation = FromTransformStamped(
-            self.editor.active_frame.tf_buffer.lookup_transform(
-                self.editor.active_frame.parent, "world", rospy.Time(0)))
+        position, orientation = self.editor.lookup_transform(
+            self.editor.active_frame.parent, "world")
         self.editor.command(Command_SetPosition(self.editor, self.editor.active_frame, position))
 
     @Slot(bool)
@@ -412,9 +528,8 @@ class FrameEditorGUI(ProjectPlugin, Interface):
 
     @Slot(bool)
     def btn_reset_orientation_abs_clicked(self, checked):
-        position, orientation = FromTransformStamped(
-            self.editor.active_frame.listener.lookupTransform(
-                self.editor.active_frame.parent, "world", rospy.Time(0)))
+        position, orientation = self.editor.lookup_transform(
+            self.editor.active_frame.parent, "world")
         self.editor.command(Command_SetOrientation(self.editor, self.editor.active_frame, orientation))
 
 
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+import threading
+import time
+import traceback
+
+
+def _value(value):
+    '''Periods may be given as callables to follow settings changed at runtime'''
+    if callable(value):
+        return value()
+    return value
+
+
+class Job(object):
+
+    def __init__(self, callback, period, idle_period=None, needs_work=None):
+        self.callback = callback
+        self.period = period
+        self.idle_period = idle_period
+        self.needs_work = needs_work
+        self.last_run = 0.0
+
+    def next_run(self):
+        '''Returns the time of the next run or None if the job is idle'''
+        if self.needs_work is None or self.needs_work():
+            return self.last_run + _value(self.period)
+        elif self.idle_period is None:
+            return None
+        else:
+            return self.last_run + _value(self.idle_period)
+
+
+class Scheduler(object):
+    '''Runs registered jobs with their own period instead of a fixed rate.
+
+    A job runs every period while its needs_work predicate is true,
+    every idle_period otherwise (or not at all if idle_period is None).
+    '''
+
+    def __init__(self):
+        self.jobs = []
+        self.condition = threading.Condition()
+        self.woken = False
+
+    def add_job(self, callback, period, idle_period=None, needs_work=None):
+        job = Job(callback, period, idle_period, needs_work)
+        with self.condition:
+            self.jobs.append(job)
+        self.wake()
+        return job
+
+    def wake(self):
+        '''Re-evaluates all jobs, e.g. after a command changed something'''
+        with self.condition:
+            self.woken = True
+            self.condition.notify()
+
+    def spin_once(self, max_sleep=0.5):
+        '''Runs all due jobs and sleeps until the next one is due'''
+        now = time.time()
+        next_time = now + max_sleep
+
+        with self.condition:
+            self.woken = False
+            jobs = list(self.jobs)
+
+        for job in jobs:
+            t = job.next_run()
+            if t is not None and t <= now:
+                job.last_run = now
+                try:
+                    job.callback()
+                except Exception as e:
+                    ## A failing job must not stop the others, e.g. broadcasting
+                    print("> Scheduled job failed: {}".format(e))
+                    traceback.print_exc()
+                t = job.next_run()
+            if t is not None:
+                next_time = min(next_time, t)
+
+        with self.condition:
+            timeout = next_time - time.time()
+            if not self.woken and timeout > 0.0:
+                self.condition.wait(timeout)
+
+# eof
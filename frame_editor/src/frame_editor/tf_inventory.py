@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+import bisect
+import threading
+
+
+class TfInventory(object):
+    '''All frame ids seen on /tf and /tf_static with their parent and last stamp.
+
+    Fed by utils_tf.TransformListener with every received message, so asking
+    for the known frames no longer means dumping and parsing the tf buffer.
+    Membership is a set lookup, ids() iterates a sorted list kept by bisection.
+
+    Listeners are called from the receiving thread when frames have been added,
+    reparented or expired, but only once until take_changes() has collected them.
+
+    Like in the tf buffer, frames which have not been sent for cache_time
+    seconds expire, static frames never do.
+    '''
+
+    def __init__(self, cache_time=10.0):
+        self.cache_time = cache_time
+
+        self.lock = threading.Lock()
+        self.parents = {} # child frame -> parent frame
+        self.stamps = {} # child frame -> stamp of the last transform in seconds
+        self.static = set() # children last sent on /tf_static
+        self.child_count = {} # parent frame -> number of children
+        self.known = set() # children and parents
+        self.sorted_ids = []
+        self.changes = set() # names added, reparented or removed since take_changes()
+        self.listeners = []
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def add_transforms(self, transforms, static=False):
+        with self.lock:
+            notify = not self.changes
+            for transform in transforms:
+                child = transform.child_frame_id.lstrip('/')
+                parent = transform.header.frame_id.lstrip('/')
+                self.stamps[child] = transform.header.stamp.to_sec()
+                if static:
+                    self.static.add(child)
+                else:
+                    self.static.discard(child)
+
+                old = self.parents.get(child)
+                if old == parent:
+                    continue
+                if old is not None:
+                    self.child_count[old] -= 1
+                self.parents[child] = parent
+                self.child_count[parent] = self.child_count.get(parent, 0) + 1
+                self.changes.add(child)
+                for name in (child, parent):
+                    if name not in self.known:
+                        self.known.add(name)
+                        bisect.insort(self.sorted_ids, name)
+                        self.changes.add(name)
+                if old is not None:
+                    self.forget(old)
+            notify = notify and bool(self.changes)
+
+        if notify:
+            self.notify()
+
+    def expire(self, now):
+        '''Removes the frames whose last transform is older than cache_time
+        at time now in seconds, and the parents no longer referenced'''
+        if not now:
+            return # no time yet, e.g. waiting for /clock
+        limit = now - self.cache_time
+        with self.lock:
+            notify = not self.changes
+            expired = [child for child, stamp in self.stamps.items()
+                       if stamp < limit and child not in self.static]
+            for child in expired:
+                parent = self.parents.pop(child)
+                del self.stamps[child]
+                self.child_count[parent] -= 1
+                self.changes.add(child)
+                self.forget(child)
+                self.forget(parent)
+            notify = notify and bool(self.changes)
+
+        if notify:
+            self.notify()
+
+    def forget(self, name):
+        '''Removes name from the known frames if nothing refers to it any more'''
+        if name in self.parents or self.child_count.get(name) or name not in self.known:
+            return
+        self.child_count.pop(name, None)
+        self.known.remove(name)
+        del self.sorted_ids[bisect.bisect_left(self.sorted_ids, name)]
+        self.changes.add(name)
+
+    def notify(self):
+        for callback in self.listeners:
+            callback()
+
+    ## Queries ##
+    ##
+    def __contains__(self, name):
+        return name in self.known
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+    def ids(self):
+        '''Returns all frame ids, sorted'''
+        with self.lock:
+            return list(self.sorted_ids)
+
+    def parent(self, name):
+        return self.parents.get(name)
+
+    def stamp(self, name):
+        return self.stamps.get(name)
+
+    def parents_of(self, names):
+        '''Returns a dict of name -> parent for names which have a parent'''
+        with self.lock:
+            return dict((name, self.parents[name]) for name in names if name in self.parents)
+
+    def all_parents(self):
+        with self.lock:
+            return dict(self.parents)
+
+    def take_changes(self):
+        '''Returns the names added, reparented or removed since the last call'''
+        with self.lock:
+            changes, self.changes = self.changes, set()
+        return changes
+
+# eof
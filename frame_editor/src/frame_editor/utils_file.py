@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+
+import os
+
+
+def replace_file(file_name, write, mode='wb'):
+    '''Calls write(f) with a temporary file which replaces file_name once it is
+    complete and on disk, so a crash leaves either the old or the new file'''
+    tmp_name = file_name + '.tmp'
+    with open(tmp_name, mode) as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_name, file_name)
+
+# eof
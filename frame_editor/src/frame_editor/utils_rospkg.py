@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+import os
+import threading
+
+import rospkg
+
+
+_lock = threading.Lock()
+_rospack = None
+_package_path = None # ROS_PACKAGE_PATH the cache was built for
+_paths = {}
+_missing = set() # packages not found since the last invalidate
+
+
+def get_path(package):
+    '''Returns the path of a ros package. ROS_PACKAGE_PATH is crawled only once.
+
+    The cache is dropped when ROS_PACKAGE_PATH changes and once for every
+    package which is not found, as it may have been added to the workspace.
+    '''
+    with _lock:
+        if os.environ.get('ROS_PACKAGE_PATH') != _package_path:
+            _invalidate()
+        if package in _paths:
+            return _paths[package]
+        if package in _missing:
+            raise rospkg.ResourceNotFound(package)
+
+        fresh = _rospack is None
+        try:
+            _paths[package] = _crawl().get_path(package)
+        except rospkg.ResourceNotFound:
+            if fresh:
+                _missing.add(package)
+                raise
+            _invalidate()
+            try:
+                _paths[package] = _crawl().get_path(package)
+            except rospkg.ResourceNotFound:
+                _missing.add(package)
+                raise
+        return _paths[package]
+
+
+def invalidate():
+    '''Forgets all resolved packages, e.g. after the workspace changed'''
+    with _lock:
+        _invalidate()
+
+
+def _invalidate():
+    global _rospack, _package_path
+    _rospack = None
+    _package_path = os.environ.get('ROS_PACKAGE_PATH')
+    _paths.clear()
+    _missing.clear()
+
+
+def _crawl():
+    global _rospack
+    if _rospack is None:
+        _rospack = rospkg.RosPack()
+    return _rospack
+
+# eof
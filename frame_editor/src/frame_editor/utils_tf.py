@@ -1,21 +1,100 @@
+import threading
+
+import numpy
 import rospy
+import tf.transformations as tft
+import tf2_ros
+
+from frame_editor.constructors_geometry import FromTransformStamped
+
+
+class TransformListener(tf2_ros.TransformListener):
+    '''TransformListener which wakes up waiting threads on every buffer update
+    and keeps the inventory of known frames up to date'''
+
+    def __init__(self, buffer, inventory=None):
+        self.updates = 0
+        self.condition = threading.Condition()
+        self.inventory = inventory
+        tf2_ros.TransformListener.__init__(self, buffer)
+
+    def callback(self, data):
+        tf2_ros.TransformListener.callback(self, data)
+        self.notify(data)
+
+    def static_callback(self, data):
+        tf2_ros.TransformListener.static_callback(self, data)
+        self.notify(data, static=True)
+
+    def notify(self, data, static=False):
+        if self.inventory is not None:
+            self.inventory.add_transforms(data.transforms, static)
+        with self.condition:
+            self.updates += 1
+            self.condition.notify_all()
+
+    def wait_for_update(self, seen, timeout):
+        '''Blocks until the buffer changed after update number seen was read'''
+        with self.condition:
+            if self.updates == seen:
+                self.condition.wait(timeout)
+            return self.updates
 
 
 def can_transform(tf_buffer, target_frame, source_frame, time_):
     return tf_buffer.can_transform_core(target_frame, source_frame, time_)[0]
 
 
-def wait_for_transform(tf_buffer, target_frame, source_frame, timeout):
+def wait_for_transform(tf_buffer, target_frame, source_frame, timeout, listener=None):
     request_time = rospy.Time.now()
-    r = rospy.Rate(100)
-    while rospy.Time.now() < request_time + timeout:
+    while True:
+        seen = listener.updates if listener else None
+
         # Try to get the most recent transform
         if can_transform(tf_buffer, target_frame, source_frame, rospy.Time(0)):
             transform = tf_buffer.lookup_transform_core(
                 target_frame, source_frame, rospy.Time(0))
             # Success if it is newer than the initial time
-            if transform.header.stamp > request_time:
+            # or if the whole chain is static (zero stamp)
+            if transform.header.stamp > request_time or transform.header.stamp.is_zero():
                 break
-        r.sleep()
+
+        remaining = (request_time + timeout - rospy.Time.now()).to_sec()
+        if remaining <= 0.0:
+            raise RuntimeError('Transform timeout.')
+
+        # Sleep until the buffer receives new data
+        if listener:
+            listener.wait_for_update(seen, remaining)
+        else:
+            rospy.sleep(min(remaining, 0.01))
+
+
+def pose_matrix(position, orientation):
+    matrix = tft.quaternion_matrix(orientation)
+    matrix[0:3, 3] = position
+    return matrix
+
+
+def matrix_pose(matrix):
+    return (tuple(tft.translation_from_matrix(matrix)),
+            tuple(tft.quaternion_from_matrix(matrix)))
+
+
+def lookup_transform(frames, tf_buffer, target_frame, source_frame):
+    '''Returns (position, orientation) of source_frame relative to target_frame.
+
+    Chains of frames contained in the FrameStore frames are composed directly,
+    the tf buffer is only asked for the transform between their foreign roots.
+    '''
+    target_root, target_matrix = frames.root_transform(target_frame)
+    source_root, source_matrix = frames.root_transform(source_frame)
+
+    if target_root == source_root:
+        root_matrix = numpy.identity(4)
     else:
-        raise RuntimeError('Transform timeout.')
+        root_matrix = pose_matrix(*FromTransformStamped(
+            tf_buffer.lookup_transform(target_root, source_root, rospy.Time(0))))
+
+    return matrix_pose(tft.concatenate_matrices(
+        tft.inverse_matrix(target_matrix), root_matrix, source_matrix))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+'''Memory and allocation benchmark for large scenes.
+
+    python benchmark_frames.py [frames]
+
+Reports the bytes kept alive per frame for a scene of plain frames and
+cubes: with the slotted frames and markers built on demand, with every
+marker materialised, and with copies of the former dict-backed classes
+which built their marker on construction.
+
+Also reports the allocations of one broadcast tick with the cached
+transform messages of the frames against building new ones every tick.
+'''
+
+import sys
+import tracemalloc
+
+import rospy
+
+from geometry_msgs.msg import Pose
+from visualization_msgs.msg import Marker
+
+from frame_editor.constructors_geometry import NewVector3, ToTransformStamped
+from frame_editor.constructors_std import NewColor
+from frame_editor.objects import Frame, Object_Cube
+
+
+## Baseline, the former classes with an instance __dict__ ##
+##
+class DictFrame(object):
+
+    def __init__(self, name, position=(0,0,0), orientation=(0,0,0,1), parent="world", style="none"):
+        self.name = name
+        self.position = position
+        self.orientation = orientation
+        self.parent = parent
+        self.style = style
+        self.color = (0.0, 0.5, 0.5, 0.75)
+
+        self.hidden = False
+        self.marker = None
+
+
+class DictGeometry(DictFrame):
+
+    def __init__(self, name, position, orientation, parent, style):
+
+        super(DictGeometry, self).__init__(name, position, orientation, parent, style)
+
+        self.marker = Marker()
+        self.marker.scale = NewVector3(1, 1, 1)
+        self.marker.pose = Pose()
+        self.marker.color = NewColor(self.color[0], self.color[1], self.color[2], self.color[3])
+        self.marker.id = 0
+        self.update_marker()
+
+    def update_marker(self):
+        self.marker.header.frame_id = self.name
+        self.marker.header.stamp = rospy.Time(1) # was Time.now(), which needs a node
+
+
+class DictCube(DictGeometry):
+
+    def __init__(self, name, position, orientation, parent, length=1.0, width=1.0, height=1.0):
+
+        self.length = length
+        self.width = width
+        self.height = height
+
+        super(DictCube, self).__init__(name, position, orientation, parent, "cube")
+
+    def update_marker(self):
+        super(DictCube, self).update_marker()
+
+        self.marker.type = Marker.CUBE
+        self.marker.scale = NewVector3(self.length, self.width, self.height)
+
+
+def build_scene(count, frame_class=Frame, cube_class=Object_Cube):
+    frames = []
+    for i in range(count):
+        name = "frame_{}".format(i)
+        if i % 2:
+            frames.append(cube_class(name, (i, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0), "world", 1.0, 1.0, 1.0))
+        else:
+            frames.append(frame_class(name, (i, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0), "world"))
+    return frames
+
+
+def measure(function):
+    '''Returns (result, bytes, blocks) allocated by function and still referenced'''
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = function()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    return result, sum(s.size_diff for s in stats), sum(s.count_diff for s in stats)
+
+
+def main(count):
+    print("Scene of {} frames ({} cubes)".format(count, count // 2))
+    baseline, size, blocks = measure(lambda: build_scene(count, DictFrame, DictCube))
+    print("  dict-backed:     {:8.0f} bytes/frame {:6.1f} blocks/frame".format(
+        float(size) / count, float(blocks) / count))
+    del baseline
+
+    frames, size, blocks = measure(lambda: build_scene(count))
+    print("  frames:          {:8.0f} bytes/frame {:6.1f} blocks/frame".format(
+        float(size) / count, float(blocks) / count))
+
+    geometry = [f for f in frames if f.has_marker]
+    markers, size, blocks = measure(lambda: [f.marker for f in geometry])
+    print("  eager markers:  +{:8.0f} bytes/frame {:6.1f} blocks/frame".format(
+        float(size) / count, float(blocks) / count))
+
+    ## The list of a tick is alive while it is sent, so its messages are counted
+    stamp = rospy.Time(1)
+    [f.transform(stamp) for f in frames] # fill the caches
+    transforms, size, blocks = measure(lambda: [f.transform(stamp) for f in frames])
+    print("Broadcast tick")
+    print("  cached:          {:8.0f} bytes/frame {:6.1f} blocks/frame".format(
+        float(size) / count, float(blocks) / count))
+    transforms, size, blocks = measure(lambda: [
+        ToTransformStamped(f.position, f.orientation, stamp, f.name, f.parent) for f in frames])
+    print("  rebuilt:         {:8.0f} bytes/frame {:6.1f} blocks/frame".format(
+        float(size) / count, float(blocks) / count))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
+
+# eof
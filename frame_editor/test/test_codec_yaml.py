@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from frame_editor import codec_yaml
+
+
+def write_file(content, file_name):
+    with open(file_name, 'wb') as f:
+        f.write(content)
+
+
+class TestFragmentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, "frames.yaml")
+        self.cache = codec_yaml.FragmentCache()
+        self.revision = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def save(self, frames):
+        '''Saves name -> x, returns the offset writing started at'''
+        self.revision += 1
+        snapshot = [(name, self.revision, None, {"position": {"x": x}}) for name, x in sorted(frames.items())]
+        content = self.cache.dumps(snapshot).encode('utf-8')
+        offset = self.cache.write(content, self.file_name, write_file)
+        with open(self.file_name, 'rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(codec_yaml.load(self.file_name)["frames"],
+            dict((name, {"position": {"x": x}}) for name, x in frames.items()))
+        return offset
+
+    def test_rewrites_from_first_change(self):
+        self.assertEqual(self.save({"a": 1.0, "b": 2.0, "c": 3.0}), 0)
+        offset = self.save({"a": 1.0, "b": 2.0, "c": 30.0})
+        self.assertEqual(offset, len(codec_yaml.FragmentCache.header) + 2 * len("  a:\n    position:\n      x: 1.0\n"))
+        self.assertEqual(self.save({"a": 1.0, "b": 2.0}), offset) # only truncated
+        self.assertEqual(self.save({"a": 10.0, "b": 2.0}), len(codec_yaml.FragmentCache.header))
+
+    def test_failed_write_keeps_file(self):
+        self.save({"a": 1.0, "b": 2.0})
+        with open(self.file_name, 'rb') as f:
+            before = f.read()
+
+        def fail(*args):
+            raise OSError("disk full")
+        content = self.cache.dumps([("a", 1, None, {}), ("b", 2, None, {})]).encode('utf-8')
+        fsync = os.fsync
+        os.fsync = fail
+        try:
+            self.assertRaises(OSError, self.cache.write, content, self.file_name, fail)
+        finally:
+            os.fsync = fsync
+
+        with open(self.file_name, 'rb') as f:
+            self.assertEqual(f.read(), before)
+
+    def test_changed_file(self):
+        self.save({"a": 1.0, "b": 2.0})
+        with open(self.file_name, 'a') as f:
+            f.write("# edited\n")
+        self.assertEqual(self.save({"a": 1.0, "b": 3.0}), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+import unittest
+
+from python_qt_binding.QtWidgets import QUndoStack
+
+from frame_editor.commands import Command_AddElement, Command_BulkLoad, Command_ClearAll, \
+    Command_RemoveSubtree, Command_SetParent, Command_SetPosition
+from frame_editor.frame_store import FrameStore
+from frame_editor.objects import Frame
+
+
+class Editor(object):
+    '''The parts of FrameEditor the commands use'''
+
+    def __init__(self):
+        self.frames = FrameStore()
+        self.active_frame = None
+        self.undo_stack = QUndoStack()
+
+    def add_undo_level(self, level, elements=None):
+        if elements and level & (1 | 4):
+            self.frames.touch(elements)
+
+    def command(self, command):
+        self.undo_stack.push(command)
+
+
+def chain(editor, names, parent="world"):
+    '''Adds frames as a chain below parent'''
+    for name in names:
+        editor.command(Command_AddElement(editor, Frame(name, (1.0, 0.0, 0.0), parent=parent)))
+        parent = name
+
+
+def assert_indexed(test, frames):
+    '''Compares the index and transforms of a store with a freshly built one'''
+    fresh = FrameStore(frames.items())
+    for name in frames:
+        test.assertEqual(frames.children(name), fresh.children(name))
+        test.assertEqual(frames.subtree(name), fresh.subtree(name))
+        root, matrix = frames.root_transform(name)
+        test.assertEqual(root, fresh.root_transform(name)[0])
+        test.assertTrue((matrix == fresh.root_transform(name)[1]).all())
+
+
+class TestRemoveSubtree(unittest.TestCase):
+
+    def setUp(self):
+        self.editor = Editor()
+        chain(self.editor, ["a", "b", "c"])
+        chain(self.editor, ["d"], "a")
+        chain(self.editor, ["e"])
+
+    def test_undo_redo(self):
+        frames = self.editor.frames
+        self.editor.active_frame = frames["c"]
+        self.editor.command(Command_RemoveSubtree(self.editor, frames["b"]))
+        self.assertEqual(sorted(frames), ["a", "d", "e"])
+        self.assertEqual(frames.children("a"), set(["d"]))
+        self.assertIsNone(self.editor.active_frame)
+
+        self.editor.undo_stack.undo()
+        self.assertEqual(sorted(frames), ["a", "b", "c", "d", "e"])
+        self.assertEqual(frames.children("a"), set(["b", "d"]))
+        self.assertIs(self.editor.active_frame, frames["c"])
+        self.assertEqual(frames.root_transform("c")[1][0, 3], 3.0)
+
+        self.editor.undo_stack.redo()
+        self.assertEqual(sorted(frames), ["a", "d", "e"])
+        self.assertEqual([f.name for f in frames.subtree("a")], ["a", "d"])
+
+
+class TestBulkLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.editor = Editor()
+        chain(self.editor, ["a", "b"])
+
+    def test_undo_redo(self):
+        editor = self.editor
+        editor.command(Command_SetPosition(editor, editor.frames["a"], (5.0, 0.0, 0.0)))
+        editor.frames.root_transform("b")
+
+        loaded = [Frame("b", (2.0, 0.0, 0.0), parent="a"), Frame("c", (1.0, 0.0, 0.0), parent="b")]
+        editor.command(Command_BulkLoad(editor, loaded))
+        editor.frames.root_transform("c")
+        editor.command(Command_SetParent(editor, editor.frames["c"], "a", keep_absolute=False))
+        self.assertEqual(editor.frames.children("a"), set(["b", "c"]))
+
+        ## Changed outside of the undo stack (like converted mesh paths), seen only by this store
+        a = editor.frames["a"]
+        a.position = (7.0, 0.0, 0.0)
+        editor.frames.touch([a])
+
+        ## Back to before the position change, then forward again
+        for i in range(3):
+            editor.undo_stack.undo()
+            assert_indexed(self, editor.frames)
+        self.assertEqual(sorted(editor.frames), ["a", "b"])
+        self.assertEqual(editor.frames.root_transform("b")[1][0, 3], 2.0)
+        self.assertFalse(editor.frames["b"].hidden)
+        self.assertTrue(loaded[0].hidden)
+
+        for i in range(3):
+            editor.undo_stack.redo()
+            assert_indexed(self, editor.frames)
+        self.assertIs(editor.frames["b"], loaded[0])
+        self.assertEqual(editor.frames.children("a"), set(["b", "c"]))
+        self.assertEqual(editor.frames.root_transform("c")[1][0, 3], 6.0)
+
+    def test_clear_all(self):
+        editor = self.editor
+        frames = editor.frames
+        editor.command(Command_ClearAll(editor))
+        self.assertEqual(len(editor.frames), 0)
+        editor.undo_stack.undo()
+        self.assertIs(editor.frames, frames)
+        assert_indexed(self, editor.frames)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof
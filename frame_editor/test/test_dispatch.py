@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+import threading
+import time
+import unittest
+
+from frame_editor import dispatch
+from frame_editor.dispatch import Dispatcher
+from frame_editor.interface import UpdateState
+from frame_editor.scheduler import Scheduler
+
+
+class Editor(object):
+
+    def __init__(self):
+        self.scheduler = Scheduler()
+
+
+class Observer(object):
+
+    def __init__(self):
+        self.updates = []
+
+    def update(self, editor, level, elements, state):
+        self.updates.append(level)
+
+
+class SlowQueue(dispatch.ObserverQueue):
+    '''Widens the window in which a second queue could be created'''
+
+    created = 0
+
+    def __init__(self, editor, observer):
+        SlowQueue.created += 1
+        time.sleep(0.05)
+        super(SlowQueue, self).__init__(editor, observer)
+
+
+class TestDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = Dispatcher(Editor())
+        self.queue_class = dispatch.ObserverQueue
+        dispatch.ObserverQueue = SlowQueue
+        SlowQueue.created = 0
+
+    def tearDown(self):
+        dispatch.ObserverQueue = self.queue_class
+
+    def test_one_queue_per_observer(self):
+        observer = Observer()
+        threads = [threading.Thread(target=self.dispatcher.dispatch,
+                                    args=([observer], level, [], UpdateState()))
+                   for level in (1, 4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(SlowQueue.created, 1)
+        self.assertEqual(len(self.dispatcher.queues), 1)
+
+        ## Merged or one by one, none is lost
+        deadline = time.time() + 1.0
+        while sum(observer.updates) < 5 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sum(observer.updates), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import rospy
+
+from frame_editor import codec_yaml
+from frame_editor.commands import Command_AddElement, Command_SetPosition
+from frame_editor.editor import FrameEditor
+from frame_editor.interface import Interface
+from frame_editor.interface_tf import FrameEditor_TF
+from frame_editor.objects import Frame
+
+
+class Observer(Interface):
+
+    synchronous = True
+
+    def __init__(self):
+        self.updates = []
+
+    def update(self, editor, level, elements, state):
+        self.updates.append((level, [element.name for element in elements], state.command))
+
+
+class Broadcaster(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def sendTransform(self, transforms):
+        self.sent.append([t.child_frame_id for t in transforms])
+
+
+def push_from_thread(editor, command):
+    '''Pushes like a service callback, without a Qt event loop running'''
+    thread = threading.Thread(target=editor.command, args=(command,))
+    thread.start()
+    thread.join()
+
+
+class TestHeadless(unittest.TestCase):
+
+    def setUp(self):
+        self.editor = FrameEditor()
+
+    def test_command_from_thread(self):
+        observer = Observer()
+        self.editor.observers.append(observer)
+        push_from_thread(self.editor, Command_AddElement(self.editor, Frame("a")))
+        self.assertEqual(observer.updates, [(1, ["a"], "Command_AddElement")])
+
+    def test_static_tf(self):
+        interface = FrameEditor_TF(self.editor)
+        interface.static_changed = False
+        push_from_thread(self.editor, Command_AddElement(self.editor, Frame("a")))
+        self.assertIn("a", interface.dirty)
+        self.assertTrue(interface.static_changed)
+
+
+class TestStaticTf(unittest.TestCase):
+
+    def setUp(self):
+        rospy.rostime.set_rostime_initialized(True)
+        self.broadcasters = Frame.tf_broadcaster, Frame.tf_static_broadcaster
+        Frame.tf_broadcaster, Frame.tf_static_broadcaster = Broadcaster(), Broadcaster()
+        self.editor = FrameEditor()
+        self.editor.static_tf = True
+        self.interface = FrameEditor_TF(self.editor)
+        self.editor.command(Command_AddElement(self.editor, Frame("a")))
+        self.interface.broadcast(self.editor)
+
+    def tearDown(self):
+        Frame.tf_broadcaster, Frame.tf_static_broadcaster = self.broadcasters
+
+    def test_added_frames_are_static(self):
+        push_from_thread(self.editor, Command_AddElement(self.editor, Frame("b")))
+        self.interface.broadcast(self.editor)
+        self.assertEqual(Frame.tf_static_broadcaster.sent, [["a"], ["a", "b"]])
+        self.assertFalse([names for names in Frame.tf_broadcaster.sent if "b" in names])
+
+    def test_edited_frames_on_tf(self):
+        push_from_thread(self.editor, Command_SetPosition(self.editor, self.editor.frames["a"], (1.0, 0.0, 0.0)))
+        self.interface.broadcast(self.editor)
+        self.assertEqual(Frame.tf_broadcaster.sent, [["a"]])
+        self.assertEqual(Frame.tf_static_broadcaster.sent, [["a"]])
+
+        ## Once edited, the final pose is latched again
+        self.interface.edit_timeout = 0.0
+        self.interface.broadcast(self.editor)
+        self.assertEqual(Frame.tf_static_broadcaster.sent, [["a"], ["a"]])
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.editor = FrameEditor()
+        for name, parent in [("a", "world"), ("b", "a"), ("_temporary", "a"), ("c", "world")]:
+            self.editor.command(Command_AddElement(self.editor, Frame(name, (1.0, 2.0, 3.0), parent=parent)))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_export_subtree(self):
+        path = os.path.join(self.directory, "subtree.yaml")
+        self.editor.export_subtree_async("a", path).wait()
+
+        data = codec_yaml.load(path)
+        self.assertEqual(sorted(data["frames"]), ["a", "b"])
+        self.assertEqual(data["frames"]["b"]["parent"], "a")
+        self.assertEqual(data["frames"]["b"]["position"], {"x": 1.0, "y": 2.0, "z": 3.0})
+
+        ## Exporting is not saving
+        self.assertEqual(self.editor.get_file_name(), "")
+        self.assertFalse(self.editor.undo_stack.isClean())
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "frames.journal")
+        self.editor = FrameEditor()
+        self.editor.start_journal(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_command_from_thread(self):
+        push_from_thread(self.editor, Command_AddElement(self.editor, Frame("a")))
+        push_from_thread(self.editor, Command_AddElement(self.editor, Frame("_temporary")))
+        self.editor.journal.flush()
+
+        with open(self.path) as f:
+            header, line = [json.loads(line) for line in f]
+        self.assertEqual(line["command"], "Command_AddElement")
+        self.assertEqual(list(line["frames"]), ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof
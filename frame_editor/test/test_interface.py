@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+import threading
+import unittest
+
+from python_qt_binding.QtCore import QCoreApplication, QEventLoop, QTimer
+
+from frame_editor.interface import UpdateCoalescer, UpdateState
+
+
+class Element(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class TestUpdateCoalescer(unittest.TestCase):
+
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.flushed = []
+        self.coalescer = UpdateCoalescer(
+            lambda level, elements, state: self.flushed.append(
+                (level, sorted(e.name for e in elements), state.command)))
+
+    def process_events(self, ms=100):
+        loop = QEventLoop()
+        QTimer.singleShot(ms, loop.quit)
+        loop.exec_()
+
+    def test_merged(self):
+        a, b = Element("a"), Element("b")
+        self.coalescer.add(1, [a], UpdateState("add"))
+        thread = threading.Thread(target=self.coalescer.add, args=(4, [b, a], UpdateState("move")))
+        thread.start()
+        thread.join()
+        self.process_events()
+        self.assertEqual(self.flushed, [(5, ["a", "b"], "move")])
+
+    def test_nothing_pending(self):
+        self.coalescer.take()
+        self.assertEqual(self.flushed, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+import threading
+import unittest
+
+from frame_editor.io_worker import IOWorker
+
+
+class TestIOWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.finishers = [] # job.finish of done jobs, like a gui queues them
+        self.reported = threading.Event()
+        self.worker = IOWorker(self.on_done)
+        self.applied = []
+
+    def on_done(self, job):
+        self.finishers.append(job.finish)
+        self.reported.set()
+
+    def submit(self, name, function=lambda: True):
+        return self.worker.submit(name, function, lambda result: self.applied.append(name))
+
+    def test_finish_in_order(self):
+        release = threading.Event()
+        first = self.submit("new file", release.wait)
+        second = self.submit("load")
+        release.set()
+
+        ## Waiting finishes the earlier job first, its queued finish does nothing later
+        self.assertTrue(second.wait(1.0))
+        self.assertEqual(self.applied, ["new file", "load"])
+        first.finish()
+        self.assertEqual(self.applied, ["new file", "load"])
+
+    def test_failed_job(self):
+        def fail():
+            raise IOError("disk full")
+        failed = self.submit("save", fail)
+        self.assertRaises(IOError, failed.wait, 1.0)
+        self.assertTrue(self.submit("load").wait(1.0))
+        self.assertEqual(self.applied, ["load"])
+
+    def test_finished_by_owner(self):
+        job = self.submit("load")
+        self.assertTrue(self.reported.wait(1.0))
+        self.assertEqual(self.applied, [])
+        for finish in self.finishers:
+            finish()
+        self.assertEqual(self.applied, ["load"])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof
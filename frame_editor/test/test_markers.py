@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import unittest
+from io import BytesIO
+
+from visualization_msgs.msg import Marker, MarkerArray
+
+from frame_editor.interface import UpdateState
+from frame_editor.interface_markers import FrameEditor_Markers, SerializedMarkerArray
+from frame_editor.objects import Object_Cube, Object_Sphere
+from frame_editor.scheduler import Scheduler
+
+
+class Editor(object):
+
+    def __init__(self):
+        self.observers = []
+        self.scheduler = Scheduler()
+        self.frames = {}
+
+    def update_state(self):
+        return UpdateState(empty=not self.frames)
+
+
+class Publisher(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, message):
+        self.messages.append(message)
+
+
+def serialize(message):
+    buff = BytesIO()
+    message.serialize(buff)
+    return buff.getvalue()
+
+
+def deserialize(data):
+    marker = Marker()
+    marker.deserialize(data)
+    return marker
+
+
+class TestSerializedMarkers(unittest.TestCase):
+
+    def setUp(self):
+        self.interface = FrameEditor_Markers(Editor())
+        self.elements = [
+            Object_Cube("cube", (1.0, 2.0, 3.0), (0.0, 0.0, 0.0, 1.0), "world", 0.1, 0.2, 0.3),
+            Object_Sphere("sphere", (0.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0), "cube", 0.5)]
+
+    def test_matches_genpy(self):
+        data = [self.interface.serialized_marker(e) for e in self.elements]
+        markers = [deserialize(d) for d in data]
+
+        for element, marker in zip(self.elements, markers):
+            self.assertEqual(marker.header.frame_id, element.name)
+            self.assertEqual(marker.id, element.marker_id)
+            self.assertEqual(marker.ns, self.interface.namespace)
+            self.assertEqual(marker.action, Marker.ADD)
+
+        self.assertEqual(serialize(SerializedMarkerArray(data)),
+                         serialize(MarkerArray(markers=markers)))
+
+    def test_cache(self):
+        cube = self.elements[0]
+        data = self.interface.serialized_marker(cube)
+        self.assertIs(self.interface.serialized_marker(cube), data)
+
+        cube.length = 2.0
+        cube.update_marker()
+        self.assertEqual(deserialize(self.interface.serialized_marker(cube)).scale.x, 2.0)
+
+    def test_broadcast(self):
+        editor = self.interface.editor
+        editor.frames = dict((e.name, e) for e in self.elements)
+        self.interface.publisher = Publisher()
+        self.interface.broadcast(editor)
+
+        message, = self.interface.publisher.messages
+        self.assertEqual(serialize(message), serialize(SerializedMarkerArray(
+            [self.interface.serialized_marker(e) for e in self.elements])))
+
+    def test_rename(self):
+        cube = self.elements[0]
+        self.interface.serialized_marker(cube)
+        cube.name = "renamed"
+        self.assertEqual(deserialize(self.interface.serialized_marker(cube)).header.frame_id, "renamed")
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import unittest
+
+import rospy
+
+from frame_editor import objects
+from frame_editor.objects import Frame
+
+
+class TestTransform(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = Frame("a", (1.0, 0.0, 0.0))
+        self.build = objects.ToTransformStamped
+
+    def tearDown(self):
+        objects.ToTransformStamped = self.build
+
+    def test_cached(self):
+        stamp = rospy.Time(2)
+        transform = self.frame.transform(rospy.Time(1))
+        self.assertIs(self.frame.transform(stamp), transform)
+        self.assertIs(transform.header.stamp, stamp)
+
+        self.frame.position = (2.0, 0.0, 0.0)
+        self.assertEqual(self.frame.transform(rospy.Time(3)).transform.translation.x, 2.0)
+
+    def test_set_while_building(self):
+        def build(*args):
+            transform = self.build(*args)
+            self.frame.position = (2.0, 0.0, 0.0) # as if from another thread
+            return transform
+        objects.ToTransformStamped = build
+        self.assertEqual(self.frame.transform(rospy.Time(1)).transform.translation.x, 1.0)
+
+        ## The stale message is not kept
+        objects.ToTransformStamped = self.build
+        self.assertEqual(self.frame.transform(rospy.Time(2)).transform.translation.x, 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import copy
+import unittest
+
+from frame_editor.objects import Frame
+from frame_editor.pose_table import PoseTable, poses
+
+
+class TestPoseTable(unittest.TestCase):
+
+    def test_grow(self):
+        table = PoseTable(capacity=2)
+        rows = [table.allocate() for i in range(5)]
+        for row in rows:
+            table.set_translation(row, (row, 0, 0))
+        self.assertEqual([table.translation(row)[0] for row in rows], [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    def test_reuse(self):
+        table = PoseTable()
+        row = table.allocate()
+        table.release(row)
+        self.assertEqual(table.allocate(), row)
+
+    def test_gather(self):
+        table = PoseTable()
+        a, b = table.allocate(), table.allocate()
+        table.set_rotation(a, (0, 0, 0, 1))
+        table.set_rotation(b, (1, 0, 0, 0))
+        translations, rotations = table.gather([b, a])
+        self.assertEqual(translations.shape, (2, 3))
+        self.assertEqual(rotations.tolist(), [[1, 0, 0, 0], [0, 0, 0, 1]])
+
+
+class TestFramePoses(unittest.TestCase):
+
+    def test_pose(self):
+        frame = Frame("a", (1, 2, 3), (0, 0, 0, 1))
+        self.assertEqual(frame.position, (1.0, 2.0, 3.0))
+        frame.position = (4, 5, 6)
+        self.assertEqual(poses.translation(frame._row), (4.0, 5.0, 6.0))
+
+    def test_copy(self):
+        frame = Frame("a", (1, 2, 3), (0, 0, 0, 1), "world", "axis")
+        other = copy.deepcopy(frame)
+        self.assertNotEqual(other._row, frame._row)
+        self.assertEqual((other.name, other.style), ("a", "axis"))
+        other.position = (0, 0, 0)
+        self.assertEqual(frame.position, (1.0, 2.0, 3.0))
+
+    def test_release(self):
+        row = Frame("a")._row
+        self.assertEqual(Frame("b")._row, row)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+import unittest
+
+from frame_editor.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_failing_job(self):
+        scheduler = Scheduler()
+        runs = []
+
+        def fail():
+            raise RuntimeError("broken job")
+        scheduler.add_job(fail, 0.0)
+        scheduler.add_job(lambda: runs.append(True), 0.0)
+
+        scheduler.spin_once(max_sleep=0.0)
+        scheduler.spin_once(max_sleep=0.0)
+        self.assertEqual(len(runs), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import unittest
+
+from geometry_msgs.msg import TransformStamped
+import rospy
+
+from frame_editor.tf_inventory import TfInventory
+
+
+def transform(child, parent, stamp):
+    t = TransformStamped()
+    t.header.frame_id = parent
+    t.header.stamp = rospy.Time(stamp)
+    t.child_frame_id = child
+    return t
+
+
+class TestTfInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.inventory = TfInventory(cache_time=10.0)
+        self.notifications = []
+        self.inventory.add_listener(lambda: self.notifications.append(True))
+
+    def test_add(self):
+        self.inventory.add_transforms([transform("/b", "a", 1), transform("c", "a", 1)])
+        self.assertEqual(self.inventory.ids(), ["a", "b", "c"])
+        self.assertEqual(self.inventory.take_changes(), set(["a", "b", "c"]))
+        self.assertEqual(self.inventory.parents_of(["a", "b"]), {"b": "a"})
+
+        self.inventory.add_transforms([transform("c", "b", 2)])
+        self.assertEqual(self.inventory.take_changes(), set(["c"]))
+        self.assertEqual(len(self.notifications), 2)
+
+    def test_expire(self):
+        self.inventory.add_transforms([transform("b", "a", 1), transform("c", "b", 1)])
+        self.inventory.add_transforms([transform("s", "a", 1)], static=True)
+        self.inventory.add_transforms([transform("c", "a", 8)])
+        self.inventory.take_changes()
+
+        self.inventory.expire(12.0)
+        self.assertEqual(self.inventory.ids(), ["a", "c", "s"])
+        self.assertEqual(self.inventory.take_changes(), set(["b"]))
+        self.assertNotIn("b", self.inventory)
+
+        self.inventory.expire(20.0)
+        self.assertEqual(self.inventory.ids(), ["a", "s"])
+        self.assertEqual(self.inventory.all_parents(), {"s": "a"})
+
+        ## The parent goes once nothing refers to it
+        self.inventory.add_transforms([transform("s", "x", 20)])
+        self.assertEqual(self.inventory.ids(), ["s", "x"])
+        self.assertEqual(self.inventory.take_changes(), set(["c", "a", "s", "x"]))
+
+    def test_no_time(self):
+        self.inventory.add_transforms([transform("b", "a", 1)])
+        self.inventory.expire(0.0)
+        self.assertIn("b", self.inventory)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof